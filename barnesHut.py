@@ -0,0 +1,247 @@
+import time
+
+import numpy as np
+
+from gravityKernels import direct_accelerations, softened_potential
+
+## Barnes-Hut gravity on a quadtree, for clusters far too big for the all-pairs pass.
+## The tree is built from sorted Morton (z-order) keys, so every node is just a
+## contiguous [start, end) run of the sorted bodies and the whole build is array ops.
+## Far away nodes (size / distance < theta) act as a single point mass at their
+## center of mass, everything else is opened down to its leaves and summed directly.
+
+MAX_DEPTH = 16  # 16 levels -> 32 bit morton keys
+
+
+def _spread_bits(v):
+    ## interleave the bits of a 16 bit integer with zeros: abcd -> 0a0b0c0d
+    v = v.astype(np.uint64)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+    return v
+
+
+class QuadTree:
+    """Flat, array based quadtree over a set of 2d bodies"""
+
+    def __init__(self, pos, mass, radius, leaf_size=8, max_depth=MAX_DEPTH):
+        pos = np.asarray(pos, dtype=np.float64)
+        mass = np.asarray(mass, dtype=np.float64)
+        radius = np.asarray(radius, dtype=np.float64)
+        n = len(pos)
+
+        ## square root cell around everything
+        lo = pos.min(axis=0)
+        self.size = float(max(np.ptp(pos, axis=0).max(), 1.0)) * (1 + 1e-9)
+        cells = 1 << max_depth
+        ij = np.clip(((pos - lo) / self.size * cells).astype(np.int64), 0, cells - 1)
+        keys = _spread_bits(ij[:, 0]) | (_spread_bits(ij[:, 1]) << np.uint64(1))
+
+        self.order = np.argsort(keys, kind="stable")
+        keys = keys[self.order]
+        self.pos = pos[self.order]
+        self.mass = mass[self.order]
+        self.radius = radius[self.order]
+
+        starts, ends, levels, parents = [], [], [], []
+        node_mass, node_weighted, node_sum, node_radius = [], [], [], []
+        weighted_pos = self.pos * self.mass[:, np.newaxis]
+        level_starts = np.zeros(1, dtype=np.int64)
+        level_ends = np.full(1, n, dtype=np.int64)
+        exists = np.ones(1, dtype=bool)
+        offset = 0
+        prev_offset = 0
+        for level in range(max_depth + 1):
+            if level > 0:
+                ## runs of identical key prefixes are the candidate cells at this level,
+                ## a cell is only a node if its parent cell was split
+                prefix = keys >> np.uint64(2 * (max_depth - level))
+                run_starts = np.concatenate(([0], np.flatnonzero(np.diff(prefix)) + 1))
+                run_ends = np.append(run_starts[1:], n)
+                parent_run = np.searchsorted(level_starts, run_starts, side="right") - 1
+                exists = split[parent_run]
+                parent_index = prev_offset + np.cumsum(prev_exists)[parent_run] - 1
+                level_starts, level_ends = run_starts, run_ends
+                starts.append(run_starts[exists])
+                ends.append(run_ends[exists])
+                parents.append(parent_index[exists])
+            else:
+                starts.append(level_starts)
+                ends.append(level_ends)
+                parents.append(np.full(1, -1, dtype=np.int64))
+            levels.append(np.full(int(exists.sum()), level, dtype=np.int64))
+
+            ## runs at one level partition [0, n) in order, so reduceat gives every cell's totals
+            node_mass.append(np.add.reduceat(self.mass, level_starts)[exists])
+            node_weighted.append(np.add.reduceat(weighted_pos, level_starts, axis=0)[exists])
+            node_sum.append(np.add.reduceat(self.pos, level_starts, axis=0)[exists])
+            node_radius.append(np.maximum.reduceat(self.radius, level_starts)[exists])
+
+            split = exists & (level_ends - level_starts > leaf_size) & (level < max_depth)
+            prev_exists = exists
+            prev_offset = offset
+            offset += int(exists.sum())
+            if not split.any():
+                break
+
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.level = np.concatenate(levels)
+        parent = np.concatenate(parents)
+
+        ## children of a node are contiguous because nodes are stored level by level in key order
+        count = len(self.start)
+        self.n_children = np.bincount(parent[1:], minlength=count)
+        self.first_child = np.full(count, -1, dtype=np.int64)
+        child_index = np.arange(1, count)
+        is_first = np.concatenate(([True], parent[2:] != parent[1:-1])) if count > 1 else np.zeros(0, bool)
+        self.first_child[parent[1:][is_first]] = child_index[is_first]
+        self.is_leaf = self.n_children == 0
+
+        self.node_mass = np.concatenate(node_mass)
+        weighted = np.concatenate(node_weighted)
+        center = np.concatenate(node_sum) / (self.end - self.start)[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            com = weighted / self.node_mass[:, np.newaxis]
+        ## massless cells fall back to their geometric average
+        self.com = np.where(self.node_mass[:, np.newaxis] > 0, com, center)
+        self.node_radius = np.concatenate(node_radius)
+        self.node_size = self.size / (1 << self.level).astype(np.float64)
+
+    def accelerations(self, G, min_dist=5.0, theta=0.5, chunk_size=4096, targets=None, potential=None):
+        """Accelerations of every body (or of the bodies at indices `targets`), in the caller's order
+
+        `potential`, if given (and targets isn't), is filled with every body's potential
+        per unit mass from the same walk: point masses for far cells, pairs in near leaves.
+        """
+        n = len(self.pos)
+        acc = np.zeros((n, 2))
+        phi = np.zeros(n) if potential is not None else None
+        if targets is None:
+            sorted_targets = np.arange(n)
+        else:
+            ## only the targets walk the tree, found by their place in the sorted order
+            rank = np.empty(n, dtype=np.int64)
+            rank[self.order] = np.arange(n)
+            sorted_targets = np.sort(rank[targets])
+        for chunk_start in range(0, len(sorted_targets), chunk_size):
+            self._walk(sorted_targets[chunk_start:chunk_start + chunk_size], acc, G, min_dist, theta, phi)
+
+        if targets is not None:
+            return acc[rank[targets]]
+        out = np.empty_like(acc)
+        out[self.order] = acc
+        if potential is not None:
+            potential[self.order] = phi
+        return out
+
+    def _walk(self, targets, acc, G, min_dist, theta, phi=None):
+        ## every (target, node) pair still to be looked at, all targets walk the tree together
+        ti = targets
+        node = np.zeros(len(targets), dtype=np.int64)
+        n = len(acc)
+        while len(ti):
+            d = self.com[node] - self.pos[ti]
+            dist = np.sqrt(np.einsum("ij,ij->i", d, d))
+            inside = (self.start[node] <= ti) & (ti < self.end[node])
+            accept = ~inside & (self.node_size[node] < theta * dist)
+
+            ## far cells: one point mass at the center of mass
+            if accept.any():
+                a_ti, a_node, a_d = ti[accept], node[accept], d[accept]
+                clamp = np.maximum(self.radius[a_ti] + self.node_radius[a_node], min_dist)
+                a_dist = np.maximum(dist[accept], clamp)
+                self._deposit(acc, a_ti, G * self.node_mass[a_node] / a_dist ** 3, a_d, n)
+                if phi is not None:
+                    phi += np.bincount(a_ti, softened_potential(dist[accept], clamp, self.node_mass[a_node], G),
+                                       minlength=n)
+
+            ## near leaves: direct sum against every body inside
+            near_leaf = ~accept & self.is_leaf[node]
+            if near_leaf.any():
+                l_ti, l_node = ti[near_leaf], node[near_leaf]
+                counts = self.end[l_node] - self.start[l_node]
+                pair_ti = np.repeat(l_ti, counts)
+                run_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                pair_j = np.repeat(self.start[l_node], counts) + run_offsets
+                keep = pair_j != pair_ti
+                pair_ti, pair_j = pair_ti[keep], pair_j[keep]
+
+                pd = self.pos[pair_j] - self.pos[pair_ti]
+                r = np.sqrt(np.einsum("ij,ij->i", pd, pd))
+                clamp = np.maximum(self.radius[pair_ti] + self.radius[pair_j], min_dist)
+                pdist = np.maximum(r, clamp)
+                self._deposit(acc, pair_ti, G * self.mass[pair_j] / pdist ** 3, pd, n)
+                if phi is not None:
+                    phi += np.bincount(pair_ti, softened_potential(r, clamp, self.mass[pair_j], G), minlength=n)
+
+            ## everything else gets opened
+            opened = ~accept & ~self.is_leaf[node]
+            o_ti, o_node = ti[opened], node[opened]
+            k = self.n_children[o_node]
+            ti = np.repeat(o_ti, k)
+            node = np.repeat(self.first_child[o_node], k) + (np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k))
+
+    @staticmethod
+    def _deposit(acc, ti, weight, d, n):
+        acc[:, 0] += np.bincount(ti, weights=weight * d[:, 0], minlength=n)
+        acc[:, 1] += np.bincount(ti, weights=weight * d[:, 1], minlength=n)
+
+
+def barnes_hut_accelerations(pos, mass, radius, G, min_dist=5.0, theta=0.5, leaf_size=8, targets=None,
+                             potential=None):
+    """Approximate accelerations with a Barnes-Hut quadtree, same call signature as direct_accelerations"""
+    if len(pos) == 0:
+        return np.zeros((0, 2))
+    tree = QuadTree(pos, mass, radius, leaf_size=leaf_size)
+    return tree.accelerations(G, min_dist=min_dist, theta=theta, targets=targets, potential=potential)
+
+
+barnes_hut_accelerations.fills_potential = True
+
+
+def accuracy_report(pos, mass, radius, G, min_dist=5.0, thetas=(0.3, 0.5, 0.7, 1.0), leaf_size=8):
+    """Compare Barnes-Hut against the exact direct sum for a few opening angles"""
+    t0 = time.perf_counter()
+    exact = direct_accelerations(pos, mass, radius, G, min_dist)
+    direct_time = time.perf_counter() - t0
+    exact_norm = np.linalg.norm(exact, axis=1)
+    exact_norm[exact_norm == 0] = 1.0
+
+    rows = []
+    for theta in thetas:
+        t0 = time.perf_counter()
+        approx = barnes_hut_accelerations(pos, mass, radius, G, min_dist, theta=theta, leaf_size=leaf_size)
+        elapsed = time.perf_counter() - t0
+        rel_err = np.linalg.norm(approx - exact, axis=1) / exact_norm
+        rows.append({
+            "theta": theta,
+            "median_rel_err": float(np.median(rel_err)),
+            "p99_rel_err": float(np.percentile(rel_err, 99)),
+            "max_rel_err": float(rel_err.max()),
+            "time_s": elapsed,
+            "direct_time_s": direct_time,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    ## random belt around a heavy primary, G and mass scale as in clusterDemo.py
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+    r = rng.uniform(80, 340, n)
+    angle = rng.uniform(0, 2 * np.pi, n)
+    pos = np.column_stack((640 + r * np.cos(angle), 360 + r * np.sin(angle)))
+    mass = rng.uniform(1, 30, n)
+    radius = np.full(n, 1.0)
+    pos[0], mass[0], radius[0] = (640, 360), 20000, 35
+
+    print(f"N = {n}")
+    print(f"{'theta':>6} {'median':>10} {'p99':>10} {'max':>10} {'bh ms':>9} {'direct ms':>10}")
+    for row in accuracy_report(pos, mass, radius, G=5000):
+        print(f"{row['theta']:>6} {row['median_rel_err']:>10.2e} {row['p99_rel_err']:>10.2e} "
+              f"{row['max_rel_err']:>10.2e} {row['time_s'] * 1000:>9.1f} {row['direct_time_s'] * 1000:>10.1f}")
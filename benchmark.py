@@ -0,0 +1,336 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # draw paths render into an off-screen surface
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # keeps --json - output clean
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from functools import partial
+
+import numpy as np
+import pygame
+
+from barnesHut import barnes_hut_accelerations
+from blockedForces import blocked_accelerations, mixed_accelerations
+from bodyStore import BodyStore
+from camera import Camera
+from collisions import candidate_pairs, reflect_off_walls, resolve_collisions, resolve_contacts
+from gravityKernels import direct_accelerations
+from pairForces import apply_pair, symmetric_python, tiled_symmetric_accelerations
+from parallelForces import ParallelForcePool, single_core_accelerations
+from particleMesh import ParticleMesh
+from renderer import Renderer
+from sceneGenerators import plummer_sphere
+from scenes import G, HEIGHT, WIDTH, BouncingBody, CelestialBody
+from trailBuffer import TrailBuffer
+
+## Timings of the hot paths of the demos, headless. Every case is one phase (force pass,
+## integration, collisions, drawing) done by one backend, timed at each N it can handle
+## (the per-object Python paths and the all-pairs matrix get slow or huge long before
+## the array paths do, so each backend has its own largest N).
+##
+##   python benchmark.py                              table on stdout
+##   python benchmark.py --json out.json              same results as JSON
+##   python benchmark.py --save-baseline base.json    remember these numbers
+##   python benchmark.py --baseline base.json         flag cases slower than the baseline,
+##                                                    exit status 1 if any are
+
+SIZES = (10, 100, 1000, 10_000, 100_000)
+MIN_DIST = 5
+
+
+## ---- scenes ----
+
+def gravity_store(n, handles=False):
+    """n bodies of a Plummer sphere on screen, optionally with CelestialBody handles"""
+    arrays = plummer_sphere(n, G, seed=n)
+    store = BodyStore(capacity=n)
+    if not handles:
+        arrays.add_to(store)
+        return store, None
+    with store.building():
+        bodies = [CelestialBody(None, arrays.pos[i], arrays.mass[i], arrays.radius[i], arrays.velocity[i],
+                                arrays.colors[i]) for i in range(n)]
+    return store, bodies
+
+
+def ball_pit(n, handles=False):
+    """n balls at the packing of create_ball_pit, in a box that grows with n; returns (store, bodies, damping, w, h)"""
+    rng = np.random.default_rng(n)
+    scale = np.sqrt(n / 2000)
+    width, height = WIDTH * scale, HEIGHT * scale
+    radius = rng.integers(3, 8, n).astype(float)
+    pos = np.column_stack((rng.uniform(radius, width - radius), rng.uniform(radius, height / 2)))
+    velocity = np.column_stack((rng.uniform(-100, 100, n), rng.uniform(-50, 50, n)))
+    store = BodyStore(capacity=n)
+    bodies = None
+    if handles:
+        with store.building():
+            bodies = [BouncingBody(pos[i], radius=radius[i], velocity=velocity[i]) for i in range(n)]
+    else:
+        store.extend(None, pos, radius, radius, velocity)
+    return store, bodies, np.full(n, 0.8), width, height
+
+
+## ---- cases: setup(n) returns a zero-argument callable doing one pass ----
+
+def force_python(n):
+    _, bodies = gravity_store(n, handles=True)
+
+    def run():
+        ## the loop clusterDemo.py started from
+        for body in bodies:
+            body.reset_acceleration()
+            for other_body in bodies:
+                if other_body is not body:
+                    body.calculate_gravitational_force(other_body)
+    return run
+
+
+def force_python_pairs(n):
+    store, bodies = gravity_store(n, handles=True)
+
+    def run():
+        ## the same loop visiting each pair once (Newton's 3rd law)
+        store.reset_accelerations()
+        for i, body in enumerate(bodies):
+            for other_body in bodies[i + 1:]:
+                apply_pair(body, other_body, G, MIN_DIST)
+    return run
+
+
+def force_solver(solver):
+    def setup(n):
+        store, _ = gravity_store(n)
+        return lambda: solver(store.pos, store.mass, store.radius, G, MIN_DIST)
+    return setup
+
+
+def integrate_python(n):
+    _, bodies = gravity_store(n, handles=True)
+
+    def run():
+        for body in bodies:
+            body.update_position(1 / 60)
+    return run
+
+
+def integrate_store(n):
+    store, _ = gravity_store(n)
+    return lambda: store.integrate(1 / 60)
+
+
+def collisions_python(n):
+    store, bodies, _, width, height = ball_pit(n, handles=True)
+
+    def run():
+        ## earthGravity.walls_and_collisions with batched = False
+        for body in bodies:
+            body.bounce_off_walls(width, height)
+        resolve_collisions(bodies, candidate_pairs(store.pos, store.radius))
+    return run
+
+
+def collisions_batched(n):
+    store, _, damping, width, height = ball_pit(n)
+
+    def run():
+        reflect_off_walls(store, damping, width, height)
+        resolve_contacts(store, candidate_pairs(store.pos, store.radius))
+    return run
+
+
+def _screen_and_trails(store):
+    screen = pygame.display.get_surface() or pygame.display.set_mode((WIDTH, HEIGHT))
+    trails = TrailBuffer(length=80, capacity=len(store))
+    store.trails = trails
+    for _ in range(80):
+        trails.record(store.pos)
+    return screen, trails
+
+
+def draw_python(n):
+    store, bodies = gravity_store(n, handles=True)
+    screen, _ = _screen_and_trails(store)
+
+    def run():
+        screen.fill("black")
+        for body in bodies:
+            body.draw(screen)
+    return run
+
+
+def draw_renderer(n):
+    store, _ = gravity_store(n)
+    screen, trails = _screen_and_trails(store)
+    renderer = Renderer(screen)
+
+    def run():
+        screen.fill("black")
+        renderer.draw_bodies(store, trails)
+    return run
+
+
+def draw_camera(n):
+    store, _ = gravity_store(n)
+    screen, trails = _screen_and_trails(store)
+    renderer = Renderer(screen)
+    ## zoomed in on the middle of the sphere: culling and level of detail decide what is drawn
+    camera = Camera(WIDTH, HEIGHT)
+    camera.zoom_at((WIDTH / 2, HEIGHT / 2), 4)
+
+    def run():
+        screen.fill("black")
+        renderer.draw_bodies(store, trails, camera)
+    return run
+
+
+## (phase, backend, setup, largest N)
+CASES = [
+    ("force", "python", force_python, 300),
+    ("force", "python-pairs", force_python_pairs, 300),
+    ("force", "python-floats", force_solver(symmetric_python), 1000),
+    ("force", "direct", force_solver(direct_accelerations), 2000),
+    ("force", "direct-blocked", force_solver(single_core_accelerations), 10_000),
+    ("force", "cache-blocked", force_solver(partial(blocked_accelerations, precision="double")), 10_000),
+    ("force", "cache-blocked-f32", force_solver(mixed_accelerations), 50_000),
+    ("force", "tiled-symmetric", force_solver(tiled_symmetric_accelerations), 10_000),
+    ("force", "barnes-hut", force_solver(barnes_hut_accelerations), 100_000),
+    ("force", "particle-mesh", force_solver(ParticleMesh()), 100_000),
+    ("force", "p3m", force_solver(ParticleMesh(p3m=True)), 1000),
+    ("integrate", "python", integrate_python, 100_000),
+    ("integrate", "store", integrate_store, 100_000),
+    ("collisions", "python", collisions_python, 10_000),
+    ("collisions", "batched", collisions_batched, 100_000),
+    ("draw", "python", draw_python, 1000),
+    ("draw", "renderer", draw_renderer, 100_000),
+    ("draw", "camera-zoomed", draw_camera, 100_000),
+]
+
+
+def _parallel_case():
+    ## only worth timing with more than one core to spread over
+    workers = os.cpu_count() or 1
+    if workers < 2:
+        return None
+    pool = ParallelForcePool(workers)
+    return ("force", f"parallel-{workers}", force_solver(pool), 10_000), pool
+
+
+def time_call(run, min_time=0.2, min_repeats=3, max_repeats=50):
+    """Median seconds per call, repeating until min_time has passed (after one warm-up call)"""
+    run()
+    samples = []
+    total = 0.0
+    while len(samples) < min_repeats or (total < min_time and len(samples) < max_repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+    return statistics.median(samples), len(samples)
+
+
+def run_benchmarks(sizes=SIZES, phases=None, backends=None, min_time=0.2, log=None):
+    """Time every selected case at every N it supports, returns a list of result dicts"""
+    pygame.init()
+    cases = list(CASES)
+    parallel = _parallel_case()
+    if parallel is not None:
+        cases.insert(4, parallel[0])
+    results = []
+    try:
+        for phase, backend, setup, largest in cases:
+            if (phases and phase not in phases) or (backends and backend not in backends):
+                continue
+            for n in sizes:
+                if n > largest:
+                    continue
+                seconds, repeats = time_call(setup(n), min_time)
+                row = {"phase": phase, "backend": backend, "n": n, "seconds": seconds, "repeats": repeats,
+                       "ns_per_body": seconds * 1e9 / n}
+                results.append(row)
+                if log is not None:
+                    log(row)
+    finally:
+        if parallel is not None:
+            parallel[1].close()
+    return results
+
+
+def _key(row):
+    return f"{row['phase']}/{row['backend']}/{row['n']}"
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Attach baseline timings to results, returns the rows more than `tolerance` slower"""
+    before = {_key(row): row["seconds"] for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        if _key(row) not in before:
+            continue
+        row["baseline_seconds"] = before[_key(row)]
+        row["ratio"] = row["seconds"] / before[_key(row)]
+        row["regression"] = row["ratio"] > 1 + tolerance
+        if row["regression"]:
+            regressions.append(row)
+    return regressions
+
+
+def _print_row(row):
+    print(f"{row['phase']:<11} {row['backend']:<15} {row['n']:>7}  {row['seconds'] * 1000:10.3f} ms"
+          f"  {row['ns_per_body']:>12,.0f} ns/body", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the simulation hot paths across N and backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--phase", action="append", help="force, integrate, collisions or draw (repeatable)")
+    parser.add_argument("--backend", action="append", help="only these backends (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend per measurement")
+    parser.add_argument("--json", help="write results to this file ('-' for stdout)")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", help="write these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    quiet = args.json == "-"
+    results = run_benchmarks(args.sizes, args.phase, args.backend, args.min_time, None if quiet else _print_row)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if not quiet:
+            for row in regressions:
+                print(f"REGRESSION {_key(row)}: {row['seconds'] * 1000:.3f} ms vs "
+                      f"{row['baseline_seconds'] * 1000:.3f} ms (x{row['ratio']:.2f})")
+            print(f"{len(regressions)} regression(s) against {args.baseline}")
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=1)
+    pygame.quit()
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import numpy as np
+
+## Exact all-pairs gravity at large N in bounded memory. direct_accelerations builds
+## N x N matrices (dozens of GB at N = 50k), single_core_accelerations still builds
+## TARGET_BLOCK x N ones. Here targets and sources both come in tiles whose scratch
+## arrays together stay under a memory budget (by default about what fits in L2), the
+## scratch is allocated once and reused for every tile, and each tile's partial sums
+## are added to float64 accumulators.
+##
+## precision="mixed" evaluates the tiles in float32 (positions relative to the centre
+## of the bodies, so the float32 offsets keep their precision) and accumulates the
+## tile sums in float64; "double" does everything in float64 and is the reference.
+## Both keep the clamp of gravityKernels.accelerations_from, dist = max(|d|, r_i + r_j,
+## min_dist).
+
+BUDGET = 1 << 20  # bytes of tile scratch, shared by the SCRATCH_ARRAYS tile arrays
+SCRATCH_ARRAYS = 4
+TARGET_TILE = 256
+PRECISIONS = {"mixed": np.float32, "double": np.float64}
+
+
+def tile_shape(n, budget=BUDGET, itemsize=4):
+    """(targets, sources) per tile so SCRATCH_ARRAYS of them fit in `budget` bytes"""
+    targets = max(1, min(n, TARGET_TILE))
+    sources = budget // (SCRATCH_ARRAYS * itemsize * targets)
+    return targets, max(1, min(n, int(sources)))
+
+
+def blocked_accelerations(pos, mass, radius, G, min_dist=5.0, precision="mixed", budget=BUDGET, targets=None):
+    """All-pairs accelerations over cache-sized tiles, float32 or float64 evaluation, float64 result
+
+    With `targets` (indices) only those bodies are tiled as targets, and only their
+    accelerations are returned.
+    """
+    dtype = PRECISIONS[precision]
+    pos = np.asarray(pos, dtype=np.float64)
+    n = len(pos)
+    m = n if targets is None else len(targets)
+    acc = np.zeros((m, 2))
+    if n == 0 or m == 0:
+        return acc
+    centre = (pos.min(axis=0) + pos.max(axis=0)) / 2
+    x = (pos[:, 0] - centre[0]).astype(dtype)
+    y = (pos[:, 1] - centre[1]).astype(dtype)
+    gm = (G * np.asarray(mass, dtype=np.float64)).astype(dtype)
+    radius = np.asarray(radius, dtype=np.float64).astype(dtype)
+    floor = dtype(min_dist)
+    ## only a zero clamp (min_dist <= 0 and radius-0 bodies) can give 0 / 0 on the diagonal
+    check_finite = min_dist <= 0 and not radius.all()
+
+    tx_all, ty_all, tr_all = (x, y, radius) if targets is None else (x[targets], y[targets], radius[targets])
+    rows, cols = tile_shape(n, budget, np.dtype(dtype).itemsize)
+    rows = min(rows, m)
+    dx, dy, r, weight = (np.empty((rows, cols), dtype=dtype) for _ in range(SCRATCH_ARRAYS))
+    part = np.empty(rows, dtype=dtype)
+    for t0 in range(0, m, rows):
+        t1 = min(t0 + rows, m)
+        tx, ty, tr = tx_all[t0:t1, np.newaxis], ty_all[t0:t1, np.newaxis], tr_all[t0:t1, np.newaxis]
+        for s0 in range(0, n, cols):
+            s1 = min(s0 + cols, n)
+            shape = (t1 - t0, s1 - s0)
+            ## views of the scratch for ragged edge tiles, every op writes in place
+            tdx, tdy = dx[:shape[0], :shape[1]], dy[:shape[0], :shape[1]]
+            tr_, tw = r[:shape[0], :shape[1]], weight[:shape[0], :shape[1]]
+            np.subtract(x[np.newaxis, s0:s1], tx, out=tdx)
+            np.subtract(y[np.newaxis, s0:s1], ty, out=tdy)
+            np.multiply(tdx, tdx, out=tr_)
+            np.multiply(tdy, tdy, out=tw)
+            tr_ += tw
+            np.sqrt(tr_, out=tr_)
+            ## clamp = max(r_i + r_j, min_dist), dist = max(r, clamp)
+            np.add(tr, radius[np.newaxis, s0:s1], out=tw)
+            np.maximum(tw, floor, out=tw)
+            np.maximum(tr_, tw, out=tr_)
+            np.multiply(tr_, tr_, out=tw)
+            tw *= tr_
+            with np.errstate(divide="ignore", invalid="ignore"):
+                np.divide(gm[np.newaxis, s0:s1], tw, out=tw)
+            if check_finite:
+                tw[~np.isfinite(tw)] = 0.0
+            ## the tile's sums in the working precision, the running totals in float64
+            np.einsum("ij,ij->i", tw, tdx, out=part[:shape[0]])
+            acc[t0:t1, 0] += part[:shape[0]]
+            np.einsum("ij,ij->i", tw, tdy, out=part[:shape[0]])
+            acc[t0:t1, 1] += part[:shape[0]]
+    return acc
+
+
+def mixed_accelerations(pos, mass, radius, G, min_dist=5.0, targets=None):
+    """blocked_accelerations in float32 with the default budget, for AccelerationEngine(solver=...)"""
+    return blocked_accelerations(pos, mass, radius, G, min_dist, "mixed", targets=targets)
+
+
+def scratch_bytes(n, precision="mixed", budget=BUDGET):
+    """Memory the tiles of one pass use, besides the O(N) copies of the inputs"""
+    itemsize = np.dtype(PRECISIONS[precision]).itemsize
+    rows, cols = tile_shape(n, budget, itemsize)
+    return SCRATCH_ARRAYS * rows * cols * itemsize + rows * itemsize
+
+
+def accuracy_report(sizes=(1000, 10_000, 50_000), G=5000, seed=0, budget=BUDGET):
+    """Time and error of each precision against the float64 blocked sum, one row per (N, precision)
+
+    Bodies are a Plummer sphere (clustered, so the clamp matters) with the demo masses.
+    Returns dicts with seconds, pairs per second, scratch bytes and relative errors.
+    """
+    import time
+
+    from sceneGenerators import plummer_sphere
+
+    rows = []
+    for n in sizes:
+        scene = plummer_sphere(n, G, seed=seed)
+        reference = None
+        for precision in ("double", "mixed"):
+            start = time.perf_counter()
+            acc = blocked_accelerations(scene.pos, scene.mass, scene.radius, G, 5.0, precision, budget)
+            seconds = time.perf_counter() - start
+            if reference is None:
+                reference = acc
+            error = np.linalg.norm(acc - reference, axis=1) / np.maximum(np.linalg.norm(reference, axis=1), 1e-300)
+            rows.append({"n": n, "precision": precision, "seconds": seconds, "pairs_per_second": n * n / seconds,
+                         "scratch_bytes": scratch_bytes(n, precision, budget),
+                         "median_rel_err": float(np.median(error)), "max_rel_err": float(error.max())})
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    sizes = [int(a) for a in sys.argv[1:]] or (1000, 10_000, 50_000)
+    print(f"tile scratch budget {BUDGET / 1024:.0f} KiB, errors against the float64 blocked sum")
+    for row in accuracy_report(sizes):
+        print(f"N={row['n']:<7} {row['precision']:<7} {row['seconds'] * 1000:10.1f} ms  "
+              f"{row['pairs_per_second'] / 1e6:8.1f} M pairs/s  scratch {row['scratch_bytes'] / 1024:6.0f} KiB  "
+              f"median rel err {row['median_rel_err']:.1e}  max {row['max_rel_err']:.1e}")
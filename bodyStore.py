@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+## Structure-of-arrays storage for bodies. Every body's pos/velocity/acceleration/mass/radius
+## lives in one preallocated array per field, and the objects the demos pass around are
+## tiny __slots__ handles that read and write their own row. Per-frame work (clearing
+## accelerations, integrating) is then a couple of in-place array ops for the whole scene
+## instead of a few new Vector2s per body.
+
+
+class BodyStore:
+    """Preallocated arrays holding the state of every body in a scene"""
+
+    _building = []  # stores that newly created handles go into, innermost last
+
+    def __init__(self, capacity=64, allocate=None):
+        self.count = 0
+        self.next_id = 0  # id of the next body added, ids are never reused until clear()
+        self.trails = None  # optional TrailBuffer recording this store's positions
+        ## zeros(shape) for the columns a force pass reads and writes (pos, acceleration,
+        ## mass, radius), e.g. ParallelForcePool.shared_zeros so worker processes map them
+        self.allocate = allocate
+        self._allocate(max(int(capacity), 1))
+
+    def use_allocator(self, allocate):
+        """Move the force-pass columns into arrays from `allocate` (None: plain NumPy arrays)"""
+        self.allocate = allocate
+        self._allocate(self.capacity)
+
+    @contextmanager
+    def building(self):
+        """Bodies created inside this block (e.g. by a scene builder) are added to this store"""
+        BodyStore._building.append(self)
+        try:
+            yield self
+        finally:
+            BodyStore._building.pop()
+
+    @classmethod
+    def current(cls):
+        ## outside any building() block bodies land in one shared default store
+        return cls._building[-1] if cls._building else default_store
+
+    def _allocate(self, capacity):
+        old = self.count
+        zeros = self.allocate or np.zeros
+        pos, velocity, acceleration = zeros((capacity, 2)), np.zeros((capacity, 2)), zeros((capacity, 2))
+        mass, radius = zeros(capacity), zeros(capacity)
+        ids = np.zeros(capacity, dtype=np.int64)
+        names, colors = [None] * capacity, [None] * capacity
+        if hasattr(self, "_pos"):
+            ## growing only happens when bodies are added, never per frame
+            pos[:old], velocity[:old], acceleration[:old] = self._pos[:old], self._velocity[:old], self._acceleration[:old]
+            mass[:old], radius[:old], ids[:old] = self._mass[:old], self._radius[:old], self._ids[:old]
+            names[:old], colors[:old] = self.names[:old], self.colors[:old]
+        self._pos, self._velocity, self._acceleration = pos, velocity, acceleration
+        self._mass, self._radius, self._ids = mass, radius, ids
+        self.names, self.colors = names, colors
+        self._scratch = np.zeros((capacity, 2))
+        self.capacity = capacity
+
+    def add(self, name, pos, mass, radius, velocity=None, color="white"):
+        """Append a body and return its index"""
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.count
+        self._pos[i] = pos[0], pos[1]
+        self._velocity[i] = (velocity[0], velocity[1]) if velocity is not None else (0, 0)
+        self._acceleration[i] = 0
+        self._mass[i] = mass
+        self._radius[i] = radius
+        self._ids[i] = self.next_id
+        self.next_id += 1
+        self.names[i] = name
+        self.colors[i] = color
+        self.count += 1
+        return i
+
+    def extend(self, names, pos, mass, radius, velocity=None, colors=None):
+        """Append many bodies from arrays at once, returns the index range they got"""
+        k = len(pos)
+        first = self.count
+        if first + k > self.capacity:
+            capacity = self.capacity
+            while capacity < first + k:
+                capacity *= 2
+            self._allocate(capacity)
+        end = first + k
+        self._pos[first:end] = pos
+        self._velocity[first:end] = velocity if velocity is not None else 0
+        self._acceleration[first:end] = 0
+        self._mass[first:end] = mass
+        self._radius[first:end] = radius
+        self._ids[first:end] = np.arange(self.next_id, self.next_id + k)
+        self.next_id += k
+        self.names[first:end] = names if names is not None else [None] * k
+        self.colors[first:end] = colors if colors is not None else ["white"] * k
+        self.count = end
+        return range(first, end)
+
+    def clear(self):
+        ## keeps the buffers, a new scene just overwrites them
+        self.count = 0
+        self.next_id = 0
+
+    def compact(self, keep):
+        """Drop the bodies where keep is False, in place, keeping the others in order
+
+        Returns the old -> new index map (-1 for removed bodies). Handles to bodies
+        after the first removed one point at the wrong row afterwards.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        kept = np.flatnonzero(keep)
+        k = len(kept)
+        for array in (self._pos, self._velocity, self._acceleration, self._mass, self._radius, self._ids):
+            array[:k] = array[kept]  # fancy indexing copies first, so overlapping rows are fine
+        kept_list = kept.tolist()
+        self.names[:k] = [self.names[i] for i in kept_list]
+        self.colors[:k] = [self.colors[i] for i in kept_list]
+        if self.trails is not None:
+            self.trails.compact(keep)
+        remap = np.full(self.count, -1, dtype=np.int64)
+        remap[kept] = np.arange(k)
+        self.count = k
+        return remap
+
+    def __len__(self):
+        return self.count
+
+    ## views of the live bodies only, no copies
+    @property
+    def pos(self):
+        return self._pos[:self.count]
+
+    @property
+    def velocity(self):
+        return self._velocity[:self.count]
+
+    @property
+    def acceleration(self):
+        return self._acceleration[:self.count]
+
+    @property
+    def mass(self):
+        return self._mass[:self.count]
+
+    @property
+    def radius(self):
+        return self._radius[:self.count]
+
+    @property
+    def ids(self):
+        """Per-body ids, numbered in the order bodies were added and kept through compact()"""
+        return self._ids[:self.count]
+
+    def reset_accelerations(self):
+        self._acceleration[:self.count] = 0
+
+    def integrate(self, dt):
+        """Semi-implicit Euler for every body, same as update_position/updatePos"""
+        n = self.count
+        scratch = self._scratch[:n]
+        np.multiply(self._acceleration[:n], dt, out=scratch)
+        self._velocity[:n] += scratch
+        np.multiply(self._velocity[:n], dt, out=scratch)
+        self._pos[:n] += scratch
+
+
+class BodyView:
+    """Handle to one row of a BodyStore, exposes the usual body attributes"""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    ## vector attributes come back as writable rows of the store arrays, so
+    ## `body.velocity += ...` updates the store in place; assigning writes the row
+    @property
+    def pos(self):
+        return self.store._pos[self.index]
+
+    @pos.setter
+    def pos(self, value):
+        self.store._pos[self.index] = value[0], value[1]
+
+    @property
+    def velocity(self):
+        return self.store._velocity[self.index]
+
+    @velocity.setter
+    def velocity(self, value):
+        self.store._velocity[self.index] = value[0], value[1]
+
+    @property
+    def acceleration(self):
+        return self.store._acceleration[self.index]
+
+    @acceleration.setter
+    def acceleration(self, value):
+        self.store._acceleration[self.index] = value
+
+    @property
+    def mass(self):
+        return float(self.store._mass[self.index])
+
+    @mass.setter
+    def mass(self, value):
+        self.store._mass[self.index] = value
+
+    @property
+    def radius(self):
+        return float(self.store._radius[self.index])
+
+    @radius.setter
+    def radius(self, value):
+        self.store._radius[self.index] = value
+
+    @property
+    def name(self):
+        return self.store.names[self.index]
+
+    @name.setter
+    def name(self, value):
+        self.store.names[self.index] = value
+
+    @property
+    def color(self):
+        return self.store.colors[self.index]
+
+    @color.setter
+    def color(self, value):
+        self.store.colors[self.index] = value
+
+    @property
+    def trail(self):
+        """Ordered recent positions, empty if the store isn't recording trails"""
+        if self.store.trails is None:
+            return self.store._pos[:0]
+        return self.store.trails.history(self.index)
+
+
+default_store = BodyStore()
@@ -0,0 +1,131 @@
+import numpy as np
+
+## World <-> screen transform for the viewers, plus a coarse grid index of the bodies
+## so drawing can ask "what is on screen" instead of walking every body. World
+## coordinates used to be screen pixels; a Camera at its default (centre of the
+## window, zoom 1) is exactly that, so nothing moves until the user pans or zooms.
+
+INDEX_CELLS = 64  # grid cells per side of the ViewIndex, keys fit in int16 so sorting is a radix sort
+
+
+class Camera:
+    """Pan and zoom: screen = (world - center) * zoom + screen center"""
+
+    def __init__(self, width, height, center=None, zoom=1.0, min_zoom=1e-3, max_zoom=50.0):
+        self.width, self.height = width, height
+        self.home = np.array(center if center is not None else (width / 2, height / 2), dtype=np.float64)
+        self.center = self.home.copy()
+        self.zoom = zoom
+        self.min_zoom, self.max_zoom = min_zoom, max_zoom
+
+    @property
+    def screen_center(self):
+        return np.array((self.width / 2, self.height / 2))
+
+    def reset(self):
+        self.center = self.home.copy()
+        self.zoom = 1.0
+
+    def to_screen(self, pos):
+        return (np.asarray(pos, dtype=np.float64) - self.center) * self.zoom + self.screen_center
+
+    def to_world(self, screen_pos):
+        return (np.asarray(screen_pos, dtype=np.float64) - self.screen_center) / self.zoom + self.center
+
+    def viewport(self, margin=0.0):
+        """(lo, hi) corners of the visible world rectangle, grown by `margin` world units"""
+        half = np.array((self.width, self.height)) / (2 * self.zoom) + margin
+        return self.center - half, self.center + half
+
+    def pan(self, dx, dy):
+        """Move the view by (dx, dy) screen pixels"""
+        self.center -= np.array((dx, dy)) / self.zoom
+
+    def zoom_at(self, screen_pos, factor):
+        """Zoom by `factor`, keeping the world point under screen_pos where it is"""
+        anchor = self.to_world(screen_pos)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.center = anchor - (np.asarray(screen_pos, dtype=np.float64) - self.screen_center) / self.zoom
+
+    def fit(self, pos, margin=0.1):
+        """Centre on the bounding box of pos and zoom so all of it is on screen"""
+        pos = np.asarray(pos, dtype=np.float64)
+        if not len(pos):
+            return self.reset()
+        lo, hi = pos.min(axis=0), pos.max(axis=0)
+        self.center = (lo + hi) / 2
+        extent = np.maximum(hi - lo, 1.0) * (1 + 2 * margin)
+        self.zoom = min(max(min(self.width / extent[0], self.height / extent[1]), self.min_zoom), self.max_zoom)
+
+
+class ViewIndex:
+    """Bodies bucketed on a coarse grid over their bounding box, queried by rectangle"""
+
+    def __init__(self, cells=INDEX_CELLS):
+        self.cells = cells
+        self.order = np.zeros(0, dtype=np.int64)
+        self._keys = np.zeros(0, dtype=np.int16)
+        self._lo = np.zeros(2)
+        self._size = np.ones(2)
+        self._built = np.zeros((0, 2))  # positions at the last build
+        self._drift = np.zeros((0, 2))
+        self.slack = 0.0  # how far any body has moved since the last build, queries grow by it
+
+    def build(self, pos):
+        pos = np.asarray(pos, dtype=np.float64)
+        if len(self._built) != len(pos):
+            self._built, self._drift = np.empty_like(pos), np.empty_like(pos)
+        self._built[:] = pos
+        self.slack = 0.0
+        if not len(pos):
+            self.order = np.zeros(0, dtype=np.int64)
+            self._keys = np.zeros(0, dtype=np.int16)
+            return self
+        ## column by column, reductions and arithmetic over (N, 2) with axis=0 are several times slower
+        x, y = pos[:, 0], pos[:, 1]
+        self._lo = np.array((x.min(), y.min()))
+        self._size = np.maximum(np.array((x.max(), y.max())) - self._lo, 1e-9) / self.cells
+        top = self.cells - 1
+        cx = np.minimum(((x - self._lo[0]) / self._size[0]).astype(np.int16), top)
+        cy = np.minimum(((y - self._lo[1]) / self._size[1]).astype(np.int16), top)
+        cy *= self.cells
+        cy += cx
+        self.order = np.argsort(cy, kind="stable")
+        self._keys = cy[self.order]
+        return self
+
+    def update(self, pos, max_drift=0.5):
+        """build() again only if bodies came or went or one moved more than max_drift cells
+
+        A drawn frame usually moves bodies by a fraction of a cell, so the sort is kept and
+        queries are widened by the largest move instead; they stay supersets.
+        """
+        pos = np.asarray(pos, dtype=np.float64)
+        if len(pos) != len(self._built) or not len(pos):
+            return self.build(pos)
+        np.subtract(pos, self._built, out=self._drift)
+        np.abs(self._drift, out=self._drift)
+        drift = float(self._drift.max())
+        if not drift <= max_drift * float(self._size.min()):  # also catches NaN
+            return self.build(pos)
+        self.slack = drift
+        return self
+
+    def _cell(self, points):
+        return np.clip(((points - self._lo) / self._size).astype(np.int64), 0, self.cells - 1)
+
+    def query(self, lo, hi):
+        """Indices of bodies in the grid cells overlapping [lo, hi] (a superset of those inside)"""
+        if not len(self.order):
+            return self.order
+        lo, hi = np.asarray(lo) - self.slack, np.asarray(hi) + self.slack
+        if np.any(hi < self._lo) or np.any(lo > self._lo + self._size * self.cells):
+            return self.order[:0]
+        (c0, r0), (c1, r1) = self._cell(np.array((lo, hi)))
+        ## each row of cells is one contiguous run of keys
+        rows = np.arange(r0, r1 + 1) * self.cells
+        starts = np.searchsorted(self._keys, rows + c0, side="left")
+        ends = np.searchsorted(self._keys, rows + c1, side="right")
+        if c0 == 0 and c1 == self.cells - 1:
+            return self.order[starts[0]:ends[-1]]  # whole rows, one run
+        return np.concatenate([self.order[s:e] for s, e in zip(starts.tolist(), ends.tolist())])
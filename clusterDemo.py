@@ -1,284 +1,205 @@
-import math 
 import pygame 
-import random
+from functools import partial
+from gravityKernels import AccelerationEngine, direct_accelerations
+from barnesHut import barnes_hut_accelerations
+from pairForces import tiled_symmetric_accelerations
+from blockedForces import mixed_accelerations
+from particleMesh import ParticleMesh
+from parallelForces import ParallelForcePool
+from trailBuffer import TrailBuffer
+from renderer import Renderer
+from camera import Camera
+from simulationEngine import Simulation
+from scenes import G, scene_integrators, simulations
+from integrators import INTEGRATORS
+from trajectoryFile import TrajectoryReader, save_snapshot
+from frameProfiler import FrameProfiler
+from diagnostics import Diagnostics
+from collisions import Accretion
+from physicsThread import PhysicsThread
 
 pygame.init()
 screen = pygame.display.set_mode((1280, 720))
 pygame.display.set_caption("Small Body Gravity Clusters")
 clock = pygame.time.Clock()
 running = True
-dt = 0
-G = 5000  # Scaled gravitational constant
 
-class CelestialBody:   
-    def __init__(self, name, pos, mass, radius, velocity=None, color="white"):
-        self.name = name
-        self.pos = pygame.Vector2(pos)
-        self.mass = mass
-        self.radius = radius 
-        self.velocity = velocity if velocity is not None else pygame.Vector2(0,0)
-        self.acceleration = pygame.Vector2(0,0)
-        self.color = color
-        self.trail = []
-        self.max_trail = 80
-
-    def calculate_gravitational_force(self, other_body): 
-        directional_vector = other_body.pos - self.pos
-        dist = directional_vector.length()
-
-        # Prevent extreme forces
-        min_dist = max(self.radius + other_body.radius, 5)
-        if dist < min_dist:
-            dist = min_dist
-        
-        force_magnitude = (G * self.mass * other_body.mass) / (dist ** 2)
-
-        if dist > 0: 
-            force_direction = directional_vector / dist
-            force_vector = force_direction * force_magnitude
-            accel_gravity = force_vector / self.mass
-            self.acceleration += accel_gravity
-    
-    def reset_acceleration(self):
-        self.acceleration = pygame.Vector2(0,0)
-
-    def update_position(self, dt): 
-        self.velocity += self.acceleration * dt 
-        self.pos += self.velocity * dt
-
-        # Add to trail
-        self.trail.append(self.pos.copy())
-        if len(self.trail) > self.max_trail:
-            self.trail.pop(0)
-
-    def draw(self, screen): 
-        # Draw trail
-        if len(self.trail) > 1:
-            for i in range(1, len(self.trail)):
-                alpha = i / len(self.trail)
-                trail_radius = max(1, int(self.radius * alpha * 0.3))
-                
-                # Fade the color
-                color = pygame.Color(self.color)
-                faded_color = (int(color.r * alpha * 0.6), 
-                              int(color.g * alpha * 0.6), 
-                              int(color.b * alpha * 0.6))
-                pygame.draw.circle(screen, faded_color, self.trail[i], trail_radius)
-        
-        # Draw main body
-        pygame.draw.circle(screen, self.color, self.pos, self.radius)
-        
-        # Draw name if radius is large enough
-        if self.radius > 8:
-            font = pygame.font.Font(None, 16)
-            text = font.render(self.name, True, self.color)
-            text_rect = text.get_rect(center=(self.pos.x, self.pos.y + self.radius + 12))
-            screen.blit(text, text_rect)
-
-def create_asteroid_cluster():
-    """Create a cluster of main belt asteroids"""
-    center = pygame.Vector2(640, 360)
-    bodies = []
-    
-    # Ceres - largest, at center
-    bodies.append(CelestialBody("Ceres", center, 8000, 20, pygame.Vector2(0, 0), "lightblue"))
-    
-    # Other asteroids in orbit around the cluster center
-    asteroids = [
-        ("Vesta", 3500, 12, "orange"),
-        ("Pallas", 3200, 11, "gray"),
-        ("Hygiea", 2800, 10, "darkgray"),
-        ("Interamnia", 2200, 8, "brown"),
-        ("Davida", 1800, 7, "tan"),
-        ("Sylvia", 1600, 6, "lightgray"),
-        ("Cybele", 1400, 6, "darkblue")
-    ]
-    
-    for i, (name, mass, radius, color) in enumerate(asteroids):
-        angle = (i / len(asteroids)) * 2 * math.pi
-        distance = 120 + random.randint(-30, 50)
-        
-        pos = center + pygame.Vector2(
-            math.cos(angle) * distance,
-            math.sin(angle) * distance
-        )
-        
-        # Orbital velocity perpendicular to radius
-        orbital_speed = math.sqrt(G * 8000 / distance) * 0.8  # Slightly elliptical
-        velocity = pygame.Vector2(-math.sin(angle), math.cos(angle)) * orbital_speed
-        velocity += pygame.Vector2(random.randint(-20, 20), random.randint(-20, 20))  # Add some chaos
-        
-        bodies.append(CelestialBody(name, pos, mass, radius, velocity, color))
-    
-    return bodies
-
-def create_kuiper_belt_cluster():
-    """Create a cluster of Kuiper Belt Objects"""
-    bodies = []
-    center = pygame.Vector2(640, 360)
-    
-    # Pluto-Charon system at center
-    pluto_pos = center + pygame.Vector2(-15, 0)
-    charon_pos = center + pygame.Vector2(15, 0)
-    
-    bodies.append(CelestialBody("Pluto", pluto_pos, 6000, 15, pygame.Vector2(0, -30), "brown"))
-    bodies.append(CelestialBody("Charon", charon_pos, 2000, 8, pygame.Vector2(0, 90), "gray"))
-    
-    # Other KBOs
-    kbos = [
-        ("Eris", 5800, 14, "white"),
-        ("Makemake", 3500, 11, "red"),
-        ("Haumea", 4200, 12, "yellow"),
-        ("Orcus", 2800, 9, "purple"),
-        ("Quaoar", 3200, 10, "lightblue"),
-        ("Sedna", 2600, 8, "orange")
-    ]
-    
-    for i, (name, mass, radius, color) in enumerate(kbos):
-        angle = random.uniform(0, 2 * math.pi)
-        distance = random.randint(150, 280)
-        
-        pos = center + pygame.Vector2(
-            math.cos(angle) * distance,
-            math.sin(angle) * distance
-        )
-        
-        # Random orbital velocity
-        speed = random.randint(40, 80)
-        velocity = pygame.Vector2(
-            random.uniform(-1, 1),
-            random.uniform(-1, 1)
-        ).normalize() * speed
-        
-        bodies.append(CelestialBody(name, pos, mass, radius, velocity, color))
-    
-    return bodies
-
-def create_jovian_moon_system():
-    """Create Jupiter's major moons system"""
-    bodies = []
-    jupiter_pos = pygame.Vector2(640, 360)
-    
-    # Jupiter at center
-    bodies.append(CelestialBody("Jupiter", jupiter_pos, 20000, 35, pygame.Vector2(0, 0), "orange"))
-    
-    # Galilean moons
-    moons = [
-        ("Io", 80, 2500, 8, "yellow"),
-        ("Europa", 110, 2200, 7, "lightblue"),
-        ("Ganymede", 150, 4000, 12, "brown"),
-        ("Callisto", 200, 3500, 10, "darkgray")
-    ]
-    
-    for name, distance, mass, radius, color in moons:
-        angle = random.uniform(0, 2 * math.pi)
-        pos = jupiter_pos + pygame.Vector2(
-            math.cos(angle) * distance,
-            math.sin(angle) * distance
-        )
-        
-        # Circular orbital velocity
-        orbital_speed = math.sqrt(G * 20000 / distance)
-        velocity = pygame.Vector2(-math.sin(angle), math.cos(angle)) * orbital_speed
-        
-        bodies.append(CelestialBody(name, pos, mass, radius, velocity, color))
-    
-    return bodies
-
-def create_random_small_bodies():
-    """Create a random cluster of small bodies"""
-    bodies = []
-    
-    for i in range(12):
-        pos = pygame.Vector2(
-            random.randint(100, 1180),
-            random.randint(100, 620)
-        )
-        
-        mass = random.randint(800, 3000)
-        radius = max(4, mass // 200)
-        
-        velocity = pygame.Vector2(
-            random.randint(-60, 60),
-            random.randint(-60, 60)
-        )
-        
-        colors = ["white", "gray", "brown", "orange", "yellow", "lightblue", "red", "purple"]
-        color = random.choice(colors)
-        
-        bodies.append(CelestialBody(f"Body{i+1}", pos, mass, radius, velocity, color))
-    
-    return bodies
+## physics runs in fixed 1/60 s steps in the engine, this script only feeds it
+## wall-clock time and draws whatever state it has
+PHYSICS_DT = 1 / 60
+## last 80 positions of every body, TRAIL_EVERY > 1 keeps only every k-th step
+TRAIL_EVERY = 1
+engine = AccelerationEngine(G, min_dist=5)
+## F shows per-phase timings (and starts recording them), D writes the recorded frames to PROFILE_PATH
+profiler = FrameProfiler(window=240)
+PROFILE_PATH = "profile_trace.csv"
+## energy, momentum and angular momentum every DIAGNOSTICS_EVERY steps, shown in the HUD
+DIAGNOSTICS_EVERY = 30
+diagnostics = Diagnostics(engine, every=DIAGNOSTICS_EVERY)
+sim = Simulation(forces=engine, dt=PHYSICS_DT, trails=TrailBuffer(length=80, every=TRAIL_EVERY), profiler=profiler,
+                 diagnostics=diagnostics)
+
+## M turns on merging: overlapping bodies combine (mass and momentum conserved) and N drops
+accretion = Accretion()
+
+## physics steps on its own thread (see physicsThread.py) and this loop only draws the
+## latest state, blended between the last two steps; False steps and draws in turn
+THREADED_PHYSICS = True
+physics = PhysicsThread(sim)
 
 # Start with asteroid cluster
 current_simulation = 0
-simulations = [
-    ("Asteroid Belt Cluster", create_asteroid_cluster),
-    ("Kuiper Belt Objects", create_kuiper_belt_cluster),
-    ("Jovian Moon System", create_jovian_moon_system),
-    ("Random Small Bodies", create_random_small_bodies)
-]
 
-bodies = simulations[current_simulation][1]()
+def load_simulation(index):
+    ## each scene brings its own integrator, I cycles through the others
+    title, builder = simulations[index]
+    with physics.edit():
+        sim.integrator = scene_integrators.get(title, "euler")
+        sim.load(builder)
+
+load_simulation(current_simulation)
 paused = False
 
+## S writes the current state to disk, L puts the simulation back at that state
+SNAPSHOT_PATH = "snapshot.nbt"
+
+## B switches between the exact all-pairs sum (every ordered pair, each pair once
+## using Newton's 3rd law, or cache-sized float32 tiles summed in float64), the Barnes-Hut tree (theta = opening angle) and the FFT
+## particle mesh (PM_CELLS^2 grid), alone or with direct close pairs (P3M)
+BARNES_HUT_THETA = 0.5
+PM_CELLS = 256
+solvers = [
+    ("Direct sum", direct_accelerations),
+    ("Direct sum, pairs once", tiled_symmetric_accelerations),
+    ("Direct sum, float32 tiles", mixed_accelerations),
+    (f"Barnes-Hut (theta={BARNES_HUT_THETA})", partial(barnes_hut_accelerations, theta=BARNES_HUT_THETA)),
+    (f"Particle mesh ({PM_CELLS}^2)", ParticleMesh(PM_CELLS)),
+    (f"Particle mesh + P3M ({PM_CELLS}^2)", ParticleMesh(PM_CELLS, p3m=True)),
+]
+## > 0 adds a multi-process direct sum (over shared memory) to the B cycle. The workers
+## are forked when the pool is made, so this has to come before physics.start()
+PARALLEL_WORKERS = 0
+parallel_pool = None
+if PARALLEL_WORKERS > 0:
+    parallel_pool = ParallelForcePool(PARALLEL_WORKERS)
+    solvers.append((f"Direct sum, {PARALLEL_WORKERS} processes", parallel_pool))
+current_solver = 0
+
+renderer = Renderer(screen)
+## mouse wheel zooms at the cursor, dragging or the arrow keys pan, C fits every body on
+## screen and HOME goes back to the plain 1280x720 view
+camera = Camera(1280, 720)
+PAN_SPEED = 600  # screen pixels per second for the arrow keys
+view = sim.store  # what the last frame drew
+if THREADED_PHYSICS:
+    physics.start()
+
 while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                paused = not paused
-            elif event.key == pygame.K_r:
-                bodies = simulations[current_simulation][1]()
-            elif event.key == pygame.K_n:  # Next simulation
-                current_simulation = (current_simulation + 1) % len(simulations)
-                bodies = simulations[current_simulation][1]()
-            elif event.key == pygame.K_p:  # Previous simulation
-                current_simulation = (current_simulation - 1) % len(simulations)
-                bodies = simulations[current_simulation][1]()
-    
-    screen.fill("black")
-    
-    if not paused:
-        # Physics calculations
-        for body in bodies:
-            body.reset_acceleration()
-        
-        for i in range(len(bodies)):
-            for j in range(i + 1, len(bodies)):
-                bodies[i].calculate_gravitational_force(bodies[j])
-                bodies[j].calculate_gravitational_force(bodies[i])
-        
-        for body in bodies:
-            body.update_position(dt)
-    
-    # Draw everything
-    for body in bodies:
-        body.draw(screen)
-    
-    # Draw UI
-    font = pygame.font.Font(None, 24)
-    title = simulations[current_simulation][0]
-    title_text = font.render(title, True, "yellow")
-    screen.blit(title_text, (10, 10))
-    
+    with profiler.phase("events"):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.MOUSEWHEEL:
+                camera.zoom_at(pygame.mouse.get_pos(), 1.15 ** event.y)
+            elif event.type == pygame.MOUSEMOTION and event.buttons[0]:
+                camera.pan(*event.rel)
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                    physics.paused = paused
+                elif event.key == pygame.K_r:
+                    load_simulation(current_simulation)
+                elif event.key == pygame.K_n:  # Next simulation
+                    current_simulation = (current_simulation + 1) % len(simulations)
+                    load_simulation(current_simulation)
+                elif event.key == pygame.K_p:  # Previous simulation
+                    current_simulation = (current_simulation - 1) % len(simulations)
+                    load_simulation(current_simulation)
+                elif event.key == pygame.K_b:  # Switch force solver
+                    current_solver = (current_solver + 1) % len(solvers)
+                    with physics.edit():
+                        engine.solver = solvers[current_solver][1]
+                        ## leapfrog would open its next step with the old solver's accelerations
+                        sim.integrator.reset()
+                elif event.key == pygame.K_i:  # Switch integrator
+                    names = list(INTEGRATORS)
+                    with physics.edit():
+                        sim.integrator = names[(names.index(sim.integrator.name) + 1) % len(names)]
+                elif event.key == pygame.K_s:  # Save snapshot
+                    with physics.edit():
+                        save_snapshot(SNAPSHOT_PATH, sim, {"scene": simulations[current_simulation][0]})
+                elif event.key == pygame.K_l:  # Load snapshot
+                    try:
+                        snapshot = TrajectoryReader(SNAPSHOT_PATH)
+                    except FileNotFoundError:
+                        snapshot = None
+                    if snapshot is not None and len(snapshot):
+                        titles = [title for title, _ in simulations]
+                        current_simulation = titles.index(snapshot.metadata.get("scene", titles[current_simulation]))
+                        with physics.edit():
+                            ## the snapshot's scene brings its integrator, like loading the scene does
+                            sim.integrator = scene_integrators.get(titles[current_simulation], "euler")
+                            snapshot.restore_simulation(sim)
+                elif event.key == pygame.K_f:  # Profiler overlay
+                    profiler.enabled = not profiler.enabled
+                    profiler.reset()
+                elif event.key == pygame.K_d:  # Dump profile trace
+                    profiler.dump(PROFILE_PATH)
+                elif event.key == pygame.K_m:  # Toggle merging
+                    with physics.edit():
+                        if accretion in sim.constraints:
+                            sim.constraints.remove(accretion)
+                        else:
+                            sim.constraints.append(accretion)
+                elif event.key == pygame.K_c:  # Fit view
+                    camera.fit(view.pos)
+                elif event.key == pygame.K_HOME:  # Reset view
+                    camera.reset()
+        held = pygame.key.get_pressed()
+        step = PAN_SPEED * clock.get_time() / 1000
+        camera.pan((held[pygame.K_LEFT] - held[pygame.K_RIGHT]) * step, (held[pygame.K_UP] - held[pygame.K_DOWN]) * step)
+    
+    with profiler.phase("draw"):
+        screen.fill("black")
+        
+        # Draw everything, trails and bodies go out in batched blits
+        view = physics.frame() if THREADED_PHYSICS else sim.store
+        renderer.draw_bodies(view, view.trails, camera)
+    
+    # Draw UI, text surfaces are cached by the renderer
     instructions = [
         "SPACE - Pause/Resume",
         "R - Reset current simulation",
         "N - Next simulation",
         "P - Previous simulation",
-        f"Bodies: {len(bodies)}",
+        "B - Switch force solver",
+        "I - Switch integrator",
+        "S/L - Save/Load snapshot",
+        "F - Profiler, D - Dump trace",
+        "M - Toggle merging",
+        "Wheel/drag/arrows - Zoom/Pan, C - Fit, HOME - Reset view",
+        f"Bodies: {len(view)}",
+        f"Solver: {solvers[current_solver][0]}",
+        f"Integrator: {sim.integrator.name}",
+        f"Merging: {'on' if accretion in sim.constraints else 'off'} ({accretion.merged} merged)",
+        f"Draw: {renderer.draw_ms:.1f} ms ({renderer.visible} visible, {renderer.lod}, zoom {camera.zoom:.2f})",
+        f"Physics: {physics.steps_per_second:.0f} steps/s" if THREADED_PHYSICS else "Physics: in the draw loop",
+        *diagnostics.hud_lines(),
         f"Status: {'PAUSED' if paused else 'RUNNING'}"
     ]
-    
-    small_font = pygame.font.Font(None, 20)
-    for i, instruction in enumerate(instructions):
-        color = "yellow" if "PAUSED" in instruction else "white"
-        text = small_font.render(instruction, True, color)
-        screen.blit(text, (10, 40 + i * 20))
-    
-    pygame.display.flip()
-    dt = clock.tick(60) / 1000 if not paused else 0
-
+    with profiler.phase("hud"):
+        renderer.draw_hud(simulations[current_simulation][0], instructions)
+        if profiler.enabled:
+            renderer.draw_profile(profiler)
+    
+    with profiler.phase("flip"):
+        pygame.display.flip()
+    frame_time = clock.tick(60) / 1000
+    if not paused and not THREADED_PHYSICS:
+        sim.advance(frame_time)
+    profiler.end_frame()
+
+physics.stop()
+if parallel_pool is not None:
+    parallel_pool.close()
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,288 @@
+import time
+
+import numpy as np
+
+## Ball-ball collisions for the earthGravity.py scene.
+## Broad phase: a uniform grid (spatial hash) with cells at least one ball diameter
+## wide, so any two touching balls share a cell or sit in neighbouring cells. Only
+## those candidates go to the narrow phase (impulse + positional correction), which
+## keeps the cost roughly linear in the number of balls at fixed density.
+## The same broad phase drives merge_overlapping (accretion) for the gravity clusters.
+
+_EMPTY_PAIRS = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+## half of the 3x3 neighbourhood, so every pair of cells is visited exactly once
+_NEIGHBOUR_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def candidate_pairs(pos, radius, cell_size=None, margin=0.0):
+    """Index arrays (i, j), i < j in lexicographic order, of pairs closer than r_i + r_j + margin"""
+    pos = np.asarray(pos, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    n = len(pos)
+    if n < 2:
+        return _EMPTY_PAIRS
+    if cell_size is None:
+        cell_size = 2 * radius.max() + margin
+    cell_size = max(cell_size, 1e-9)
+
+    cells = np.floor(pos / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # keep neighbour lookups non-negative
+    stride = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * stride + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first, second = [], []
+    for dx, dy in _NEIGHBOUR_OFFSETS:
+        query = keys + dx * stride + dy
+        lo = np.searchsorted(sorted_keys, query, side="left")
+        counts = np.searchsorted(sorted_keys, query, side="right") - lo
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(n), counts)
+        j = order[np.repeat(lo, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)]
+        if dx == 0 and dy == 0:
+            ## same cell: each pair shows up twice (and every ball with itself)
+            keep = j > i
+            i, j = i[keep], j[keep]
+        first.append(i)
+        second.append(j)
+    if not first:
+        return _EMPTY_PAIRS
+
+    i = np.concatenate(first)
+    j = np.concatenate(second)
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    d = pos[i] - pos[j]
+    reach = radius[i] + radius[j] + margin
+    close = np.einsum("ij,ij->i", d, d) < reach * reach
+    i, j = i[close], j[close]
+
+    ## same visiting order as the old double loop over (i, j > i)
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def resolve_collisions(bodies, pairs=None):
+    """Elastic impulse plus positional correction for every overlapping pair
+
+    pairs is an (i, j) pair of index arrays into bodies, e.g. from candidate_pairs;
+    without it every i < j pair is tested like before.
+    """
+    if pairs is None:
+        count = len(bodies)
+        pairs = ((i, j) for i in range(count) for j in range(i + 1, count))
+    else:
+        pairs = zip(pairs[0].tolist(), pairs[1].tolist())
+
+    for i, j in pairs:
+        b1 = bodies[i]
+        b2 = bodies[j]
+
+        n = b1.pos - b2.pos ## vector from p2 to p1 to see the vector on which the collision happens 
+        dist = (n[0] ** 2 + n[1] ** 2) ** 0.5
+        min_dist = b1.radius + b2.radius 
+
+        ## if the distance between the 2 objects is less than the sum of the radii then collsion happens
+        if dist < min_dist: ## collision happens
+            if dist == 0:
+                dist = 0.01 ## avoid division by 0
+
+            ## normalize the collision axis 
+            normal = n / dist
+
+            ## calcualte the relative velocity
+            rel_velocity = b1.velocity - b2.velocity ## how fast b1 is going towards b2 
+            vel_along_normal = rel_velocity.dot(normal)
+            ## dot product gives you the magnitude of relative velocity along the axis
+            ## if negative it means they're going towards each other, positive meaning away, zero being parallel
+
+            ## in case they're moving away from each other
+            if vel_along_normal > 0: 
+                continue
+
+            # compute impulse
+            m1, m2 = b1.mass, b2.mass
+            impulse = (2 * vel_along_normal) / (m1 + m2) 
+
+            ## Apply the impluse to both velocites
+            b1.velocity -= (impulse * m2) * normal 
+            b2.velocity += (impulse * m1) * normal
+
+
+            # push bodies apart to avoid voerlap
+            overlap = min_dist - dist 
+            correction = normal * (overlap / (m1 + m2)) 
+            b1.pos += correction * m2 
+            b2.pos -= correction * m1
+
+
+def _independent_rounds(i, j, count):
+    """Split an ordered pair list into rounds where no body appears twice
+
+    A pair goes in the first round after every earlier pair that shares one of its
+    bodies, so resolving the rounds one after another (each one all at once) gives
+    exactly what the sequential loop gives.
+    """
+    remaining = np.arange(len(i))
+    while len(remaining):
+        ri, rj = i[remaining], j[remaining]
+        ## a pair is ready if it is the first remaining pair for both of its bodies
+        both = np.concatenate((ri, rj))
+        slot = np.concatenate((np.arange(len(ri)), np.arange(len(rj))))
+        first = np.full(count, len(ri))
+        np.minimum.at(first, both, slot)
+        ready = (first[ri] == np.arange(len(ri))) & (first[rj] == np.arange(len(rj)))
+        yield remaining[ready]
+        remaining = remaining[~ready]
+
+
+def resolve_contacts(store, pairs):
+    """Array version of resolve_collisions for a BodyStore, same result as the sequential loop"""
+    i_all, j_all = pairs
+    if not len(i_all):
+        return 0
+    pos, velocity, mass, radius = store.pos, store.velocity, store.mass, store.radius
+    resolved = 0
+    for batch in _independent_rounds(i_all, j_all, len(store)):
+        i, j = i_all[batch], j_all[batch]
+        n = pos[i] - pos[j]
+        dist = np.sqrt(np.einsum("ij,ij->i", n, n))
+        min_dist = radius[i] + radius[j]
+        ## overlapping and not already separating, like the checks in resolve_collisions
+        dist = np.where(dist == 0, 0.01, dist)
+        normal = n / dist[:, np.newaxis]
+        vel_along_normal = np.einsum("ij,ij->i", velocity[i] - velocity[j], normal)
+        hit = (dist < min_dist) & ~(vel_along_normal > 0)
+        if not hit.any():
+            continue
+        i, j, normal, dist, min_dist, vel_along_normal = i[hit], j[hit], normal[hit], dist[hit], min_dist[hit], vel_along_normal[hit]
+
+        m1, m2 = mass[i], mass[j]
+        total = m1 + m2
+        impulse = (2 * vel_along_normal) / total
+        velocity[i] -= (impulse * m2)[:, np.newaxis] * normal
+        velocity[j] += (impulse * m1)[:, np.newaxis] * normal
+
+        correction = normal * ((min_dist - dist) / total)[:, np.newaxis]
+        pos[i] += correction * m2[:, np.newaxis]
+        pos[j] -= correction * m1[:, np.newaxis]
+        resolved += len(i)
+    return resolved
+
+
+def reflect_off_walls(store, damping, width, height):
+    """Array version of BouncingBody.bounce_off_walls for every body at once"""
+    pos, velocity, radius = store.pos, store.velocity, store.radius
+    damping = np.broadcast_to(np.asarray(damping, dtype=np.float64), radius.shape)
+    x, y = pos[:, 0], pos[:, 1]
+    vx, vy = velocity[:, 0], velocity[:, 1]
+
+    ## same order as the scalar version: bottom, top, right, left
+    hit = y + radius >= height
+    y[hit] = height - radius[hit]
+    vy[hit] = -vy[hit] * damping[hit]
+
+    hit = y - radius <= 0
+    y[hit] = radius[hit]
+    vy[hit] = -vy[hit] * damping[hit]
+
+    hit = x + radius >= width
+    x[hit] = width - radius[hit]
+    vx[hit] = -vx[hit] * damping[hit]
+
+    hit = x - radius <= 0
+    x[hit] = radius[hit]
+    vx[hit] = -vx[hit] * damping[hit]
+
+
+def _groups(i, j, count):
+    ## connected components of the pair graph, labelled by their lowest index
+    label = np.arange(count)
+    while True:
+        low = np.minimum(label[i], label[j])
+        new = label.copy()
+        np.minimum.at(new, i, low)
+        np.minimum.at(new, j, low)
+        new = new[new]  # pointer jumping, halves the remaining depth
+        if np.array_equal(new, label):
+            return label
+        label = new
+
+
+def merge_overlapping(store, pairs=None):
+    """Inelastic merging: every group of overlapping bodies becomes one body
+
+    The survivor is the heaviest body of the group. It takes the total mass, the
+    momentum-conserving velocity and the centre of mass; its radius grows as
+    mass^(1/3) at its own density. Other group members are removed with
+    BodyStore.compact. Returns how many bodies were removed.
+    """
+    i, j = candidate_pairs(store.pos, store.radius) if pairs is None else pairs
+    if not len(i):
+        return 0
+    n = len(store)
+    pos, velocity, mass, radius = store.pos, store.velocity, store.mass, store.radius
+    label = _groups(i, j, n)
+    members = np.unique(np.concatenate((i, j)))
+    group = label[members]
+
+    ## heaviest member of each group survives (lowest index on ties)
+    order = np.lexsort((members, -mass[members], group))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = group[order][1:] != group[order][:-1]
+    survivors = members[order][first]
+    survivor_of = np.empty(n, dtype=np.int64)
+    survivor_of[group[order][first]] = survivors
+    owner = survivor_of[group]
+
+    total = np.bincount(owner, mass[members], minlength=n)[survivors]
+    com = np.column_stack([np.bincount(owner, mass[members] * pos[members, k], minlength=n)[survivors]
+                           for k in range(2)]) / total[:, np.newaxis]
+    momentum = np.column_stack([np.bincount(owner, mass[members] * velocity[members, k], minlength=n)[survivors]
+                                for k in range(2)])
+
+    radius[survivors] *= np.cbrt(total / mass[survivors])
+    pos[survivors] = com
+    velocity[survivors] = momentum / total[:, np.newaxis]
+    mass[survivors] = total
+
+    keep = np.ones(n, dtype=bool)
+    keep[members] = False
+    keep[survivors] = True
+    store.compact(keep)
+    return len(members) - len(survivors)
+
+
+class Accretion:
+    """Simulation constraint merging overlapping bodies after every substep"""
+
+    def __init__(self):
+        self.merged = 0  # bodies absorbed so far
+
+    def __call__(self, store, dt):
+        removed = merge_overlapping(store)
+        self.merged += removed
+        return removed > 0  # False: nothing moved, integrators may keep their state
+
+
+def broad_phase_scaling(counts=(1000, 2000, 4000, 8000, 16000), density=0.25, radius=6.0, seed=0):
+    """Time candidate_pairs at a fixed packing density, returns [(n, ms, pairs)]"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in counts:
+        ## box sized so the balls cover `density` of its area
+        side = np.sqrt(n * np.pi * radius ** 2 / density)
+        pos = rng.uniform(0, side, (n, 2))
+        r = np.full(n, radius)
+        start = time.perf_counter()
+        i, _ = candidate_pairs(pos, r)
+        rows.append((n, (time.perf_counter() - start) * 1000, len(i)))
+    return rows
+
+
+if __name__ == "__main__":
+    for n, ms, found in broad_phase_scaling():
+        print(f"{n:>7} balls  {ms:8.2f} ms  {found:>7} overlapping pairs  {ms * 1000 / n:6.2f} us/ball")
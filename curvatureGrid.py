@@ -0,0 +1,165 @@
+import numpy as np
+
+## Spacetime "rubber sheet" for einestienTheoryRelativity.py: the summed depth of the
+## Flamm paraboloids of many masses on a regular grid.
+##
+## A mass with Schwarzschild radius rs embeds as z(r) = 2 sqrt(rs (r - rs)). That keeps
+## rising forever, so as a dip each mass contributes z(r) - z(R) inside an influence
+## radius R = max(reach * rs, min_reach) and nothing outside it (r is clamped to rs at
+## the throat). min_reach keeps light masses from vanishing into a dip narrower than
+## a grid cell.
+## With finite support a mass only touches the grid cells in a square window around it,
+## so adding, moving or removing masses updates just those windows: a mass's dip is
+## recomputed from its stored (x, y, mass) and subtracted again. Windows are handled
+## in bulk, one (masses, window, window) array per window size added onto the grid
+## with np.add.at (only the window cells are touched), so a frame where every mass moved costs a few array passes, not a
+## Python loop. rebuild() lays down every dip from scratch the same way; sync() does
+## that instead of take-back-and-add when most masses are stale (half the work), and
+## it also runs every `rebuild_every` updates to wash out rounding.
+
+
+def schwarzschild_radius(mass, G, c):
+    return 2 * G * np.asarray(mass, dtype=np.float64) / (c * c)
+
+
+def influence_radius(rs, reach, min_reach=0.0):
+    return np.maximum(reach * np.asarray(rs, dtype=np.float64), min_reach)
+
+
+def flamm_depth(r, rs, reach, min_reach=0.0):
+    """Depth (<= 0) of one mass's dip at distance r, zero from influence_radius() on"""
+    rs = np.asarray(rs, dtype=np.float64)
+    outer = influence_radius(rs, reach, min_reach)
+    r = np.clip(r, rs, outer)
+    return 2 * np.sqrt(rs * (r - rs)) - 2 * np.sqrt(rs * (outer - rs))
+
+
+class FlammGrid:
+    """Summed Flamm-paraboloid depth of a set of masses on a (rows, cols) grid"""
+
+    def __init__(self, width, height, spacing=16, G=1000, c=300, reach=40.0, min_reach=0.0, rebuild_every=600,
+                 chunk=64):
+        self.spacing = spacing
+        self.xs = np.arange(0, width + spacing / 2, spacing, dtype=np.float64)
+        self.ys = np.arange(0, height + spacing / 2, spacing, dtype=np.float64)
+        self.depth = np.zeros((len(self.ys), len(self.xs)))
+        self.G, self.c, self.reach, self.min_reach = G, c, reach, min_reach
+        self.rebuild_every = rebuild_every  # updates (add/move/remove calls or changing syncs) between rebuilds
+        self.chunk = chunk  # masses per block of a scatter, bounds memory to chunk x window^2
+        self.bodies = {}  # key -> (x, y, mass) the grid currently holds
+        self.updates = 0  # cells rewritten by incremental updates so far, for stats
+        self._since_rebuild = 0
+
+    @property
+    def shape(self):
+        return self.depth.shape
+
+    def _scatter(self, x, y, mass, sign=1.0):
+        ## add (sign 1) or take back (sign -1) the dips of many masses at once
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        if not len(x):
+            return 0
+        rs = schwarzschild_radius(mass, self.G, self.c)
+        ## a window of 2 half + 1 cells from floor(x / s) - half covers every cell within R
+        half = np.ceil(influence_radius(rs, self.reach, self.min_reach) / self.spacing).astype(np.int64)
+        rows, cols = self.depth.shape
+        grid = self.depth.reshape(-1)  # a view, the windows are added straight into it
+        cells = 0
+        for h in np.unique(half).tolist():
+            offsets = np.arange(-h, h + 1)
+            same = np.flatnonzero(half == h)
+            for start in range(0, len(same), self.chunk):
+                pick = same[start:start + self.chunk]
+                c = np.floor(x[pick] / self.spacing).astype(np.int64)[:, np.newaxis] + offsets
+                r = np.floor(y[pick] / self.spacing).astype(np.int64)[:, np.newaxis] + offsets
+                dx = c * self.spacing - x[pick, np.newaxis]
+                dy = r * self.spacing - y[pick, np.newaxis]
+                dist = np.sqrt(dx[:, np.newaxis, :] ** 2 + dy[:, :, np.newaxis] ** 2)
+                dip = flamm_depth(dist, rs[pick, np.newaxis, np.newaxis], self.reach, self.min_reach)
+                inside = ((r >= 0) & (r < rows))[:, :, np.newaxis] & ((c >= 0) & (c < cols))[:, np.newaxis, :]
+                flat = r[:, :, np.newaxis] * cols + c[:, np.newaxis, :]
+                np.add.at(grid, flat[inside], sign * dip[inside])
+                cells += int(inside.sum())
+        return cells
+
+    def _count_update(self):
+        self._since_rebuild += 1
+        if self._since_rebuild >= self.rebuild_every:
+            self.rebuild()
+
+    def add(self, key, x, y, mass):
+        if key in self.bodies:
+            self._take_back([key])
+        self.bodies[key] = (float(x), float(y), float(mass))
+        self.updates += self._scatter([x], [y], [mass])
+        self._count_update()
+
+    def move(self, key, x, y, mass=None):
+        mass = self.bodies[key][2] if mass is None else mass
+        self._take_back([key])
+        self.add(key, x, y, mass)
+
+    def remove(self, key):
+        self._take_back([key])
+        self._count_update()
+
+    def _take_back(self, keys):
+        old = np.array([self.bodies.pop(key) for key in keys]).reshape(-1, 3)
+        self.updates += self._scatter(old[:, 0], old[:, 1], old[:, 2], -1.0)
+
+    def clear(self):
+        self.bodies.clear()
+        self.depth[:] = 0.0
+        self._since_rebuild = 0
+
+    def sync(self, keys, pos, mass, tolerance=1.0):
+        """Bring the grid in line with bodies (keys, (n, 2) positions, masses) in bulk
+
+        Bodies that moved less than `tolerance` (and kept their mass) are left alone,
+        new keys are added and keys no longer present are removed. Returns how many
+        bodies were updated.
+        """
+        keys = list(keys)
+        pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+        mass = np.broadcast_to(np.asarray(mass, dtype=np.float64), len(keys))
+        present = set(keys)
+        gone = [key for key in self.bodies if key not in present]
+        old = np.array([self.bodies.get(key, (np.nan, np.nan, np.nan)) for key in keys]).reshape(-1, 3)
+        moved = np.hypot(pos[:, 0] - old[:, 0], pos[:, 1] - old[:, 1]) >= tolerance
+        stale = np.isnan(old[:, 0]) | moved | (mass != old[:, 2])
+        changed = len(gone) + int(stale.sum())
+        if not changed:
+            return 0
+
+        fresh = np.flatnonzero(stale)
+        if 2 * changed >= len(self.bodies):
+            ## most of it would be taken back and added again, laying it all down anew is cheaper
+            self.bodies = dict(zip(keys, zip(pos[:, 0].tolist(), pos[:, 1].tolist(), mass.tolist())))
+            self.rebuild()
+            return changed
+        self._take_back(gone + [keys[k] for k in fresh.tolist() if keys[k] in self.bodies])
+        for k in fresh.tolist():
+            self.bodies[keys[k]] = (float(pos[k, 0]), float(pos[k, 1]), float(mass[k]))
+        self.updates += self._scatter(pos[fresh, 0], pos[fresh, 1], mass[fresh])
+        self._count_update()
+        return changed
+
+    def rebuild(self):
+        """Recompute the whole surface from the current bodies, all masses in vectorized blocks"""
+        self.depth[:] = 0.0
+        self._since_rebuild = 0
+        if self.bodies:
+            held = np.array(list(self.bodies.values()))
+            self._scatter(held[:, 0], held[:, 1], held[:, 2])
+        return self.depth
+
+    def depth_at(self, x, y):
+        """Surface depth at arbitrary points (bilinear), e.g. to sit bodies on the sheet"""
+        fx = np.clip(np.asarray(x, dtype=np.float64) / self.spacing, 0, len(self.xs) - 1.000001)
+        fy = np.clip(np.asarray(y, dtype=np.float64) / self.spacing, 0, len(self.ys) - 1.000001)
+        c0, r0 = fx.astype(np.int64), fy.astype(np.int64)
+        tx, ty = fx - c0, fy - r0
+        d = self.depth
+        top = d[r0, c0] * (1 - tx) + d[r0, c0 + 1] * tx
+        bottom = d[r0 + 1, c0] * (1 - tx) + d[r0 + 1, c0 + 1] * tx
+        return top * (1 - ty) + bottom * ty
@@ -0,0 +1,167 @@
+import numpy as np
+
+from gravityKernels import fills_potential, softened_potential
+
+## Conserved quantities of a run: kinetic and potential energy, linear and angular
+## momentum, centre of mass. The potential is the one the clamped force law implies
+## (see gravityKernels.softened_potential), so a perfect integrator keeps the total
+## energy exactly constant.
+##
+## Summed directly, potential energy is O(N^2) like the direct force pass. Diagnostics
+## avoids paying that twice: around each sample it asks the AccelerationEngine to keep
+## the per-body potential of its force passes (capture_potential, for solvers that can
+## fill one in: the direct sum, Barnes-Hut's tree walk, the particle mesh's grid), and
+## uses it whenever a pass was made at exactly the sampled positions. That is the
+## closing pass of a leapfrog step, or for semi-implicit Euler the first pass of the
+## following step, which is why a sample can be completed one step late. Otherwise the
+## potential is computed from a copy of the state, by one extra pass of the same solver
+## when it can fill one in (so Barnes-Hut and the mesh stay O(N log N) / O(N)), and by
+## the direct pair sum only for solvers that are O(N^2) themselves (pairs once, the
+## blocked float32 kernel, the process pool), i.e. at most one extra pass per sample.
+## Approximate solvers give their own approximate potential, consistent with the forces
+## they integrate, so the drift stays meaningful.
+
+BLOCK = 256  # rows per block of the stand-alone potential sum
+
+
+def kinetic_energy(velocity, mass):
+    return 0.5 * float(np.sum(mass * np.einsum("ij,ij->i", velocity, velocity)))
+
+
+def potential_energy(pos, mass, radius, G, min_dist=5.0):
+    """Sum over pairs of the softened potential, in row blocks so memory stays ~BLOCK x N"""
+    total = 0.0
+    for start in range(0, len(pos), BLOCK):
+        end = min(start + BLOCK, len(pos))
+        r = np.linalg.norm(pos[np.newaxis, :, :] - pos[start:end, np.newaxis, :], axis=2)
+        clamp = np.maximum(radius[start:end, np.newaxis] + radius[np.newaxis, :], min_dist)
+        phi = softened_potential(r, clamp, mass[np.newaxis, :], G)
+        phi[r == 0] = 0.0
+        total += float(mass[start:end] @ phi.sum(axis=1))
+    return total / 2  # every pair was counted from both ends
+
+
+def center_of_mass(pos, mass):
+    return mass @ pos / mass.sum()
+
+
+def linear_momentum(velocity, mass):
+    return mass @ velocity
+
+
+def angular_momentum(pos, velocity, mass, origin=(0.0, 0.0)):
+    """z component of sum m (r x v) about origin"""
+    rel = pos - origin
+    return float(np.sum(mass * (rel[:, 0] * velocity[:, 1] - rel[:, 1] * velocity[:, 0])))
+
+
+def total_energy(store, G, min_dist=5.0):
+    return kinetic_energy(store.velocity, store.mass) + potential_energy(store.pos, store.mass, store.radius, G,
+                                                                         min_dist)
+
+
+class Sample:
+    """Conserved quantities of one moment of a run"""
+
+    __slots__ = ("time", "step", "kinetic", "potential", "momentum", "angular_momentum", "center_of_mass", "reused")
+
+    def __init__(self, time, step, kinetic, potential, momentum, angular_momentum, center_of_mass, reused):
+        self.time = time
+        self.step = step
+        self.kinetic = kinetic
+        self.potential = potential
+        self.momentum = momentum
+        self.angular_momentum = angular_momentum
+        self.center_of_mass = center_of_mass
+        self.reused = reused  # potential came from the force pass
+
+    @property
+    def energy(self):
+        return self.kinetic + self.potential
+
+    def as_dict(self):
+        return {"time": self.time, "step": self.step, "kinetic": self.kinetic, "potential": self.potential,
+                "energy": self.energy, "px": float(self.momentum[0]), "py": float(self.momentum[1]),
+                "angular_momentum": self.angular_momentum, "com_x": float(self.center_of_mass[0]),
+                "com_y": float(self.center_of_mass[1]), "reused": self.reused}
+
+
+class Diagnostics:
+    """Samples a Simulation's conserved quantities every `every` steps"""
+
+    def __init__(self, engine, every=30, max_samples=10_000):
+        self.engine = engine  # the AccelerationEngine the simulation uses, for G, min_dist and reuse
+        self.every = max(1, int(every))
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self):
+        self.samples = []
+        self._pending = None
+        self.engine.capture_potential = False
+        self.engine.captured = None
+
+    @property
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def drift(self):
+        """Relative energy change since the first sample"""
+        if len(self.samples) < 2 or self.samples[0].energy == 0:
+            return 0.0
+        return self.samples[-1].energy / self.samples[0].energy - 1
+
+    def update(self, sim):
+        """Call after every step (Simulation does when given diagnostics)"""
+        store = sim.store
+        if self._pending is not None:
+            self._finish()
+        if sim.steps % self.every == 0 and len(store):
+            self._pending = (sim.time, sim.steps, store.pos.copy(), store.velocity.copy(), store.mass.copy(),
+                             store.radius.copy())
+            if self._matching_potential() is not None:
+                self._finish()
+        ## keep potentials from the passes that can complete the current or next sample
+        self.engine.capture_potential = self._pending is not None or (sim.steps + 1) % self.every == 0
+
+    def _matching_potential(self):
+        captured = self.engine.captured
+        if captured is None or self._pending is None:
+            return None
+        pos, potential = captured
+        return potential if pos.shape == self._pending[2].shape and np.array_equal(pos, self._pending[2]) else None
+
+    def _finish(self):
+        time, step, pos, velocity, mass, radius = self._pending
+        phi = self._matching_potential()
+        reused = phi is not None
+        solver = self.engine.solver
+        if phi is None and fills_potential(solver):
+            phi = np.empty(len(pos))
+            solver(pos, mass, radius, self.engine.G, self.engine.min_dist, potential=phi)
+        if phi is not None:
+            potential = float(mass @ phi) / 2
+        else:
+            potential = potential_energy(pos, mass, radius, self.engine.G, self.engine.min_dist)
+        com = center_of_mass(pos, mass) if mass.sum() else np.zeros(2)
+        sample = Sample(time, step, kinetic_energy(velocity, mass), potential, linear_momentum(velocity, mass),
+                        angular_momentum(pos, velocity, mass, com), com, reused)
+        if len(self.samples) >= self.max_samples:
+            ## keep the first sample, drift is measured against it
+            del self.samples[1]
+        self.samples.append(sample)
+        self._pending = None
+        self.engine.captured = None
+
+    def hud_lines(self):
+        sample = self.latest
+        if sample is None:
+            return ["Energy: -"]
+        px, py = sample.momentum
+        cx, cy = sample.center_of_mass
+        return [
+            f"Energy: {sample.energy:,.4g} (drift {self.drift():+.2e})",
+            f"Momentum: ({px:,.4g}, {py:,.4g})",
+            f"Angular momentum: {sample.angular_momentum:,.4g}",
+            f"Center of mass: ({cx:.1f}, {cy:.1f})",
+        ]
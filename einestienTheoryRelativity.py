@@ -1,5 +1,12 @@
 import pygame
 import math
+import numpy as np
+from curvatureGrid import FlammGrid
+from vectors3d import vectors, rotate_x, perspective
+from gravityKernels import AccelerationEngine
+from collisions import Accretion
+from sceneGenerators import belt
+from simulationEngine import Simulation
 
 pygame.init()
 screen = pygame.display.set_mode((1280, 720))
@@ -8,6 +15,7 @@ running = True
 dt = 0
 G = 6.67430e-11 ##gravitational constant 
 G = 1000 ## Scaled for visual effects 
+C = 1000 ## speed of light, scaled the same way so rs = 2GM/c^2 comes out in pixels
 
 ## Colors
 BLACK = (0, 0, 0)
@@ -19,6 +27,7 @@ YELLOW = (255, 255, 100)
 GRAY = (150, 150, 150)
 
 ## Class to define 3-d objects for calculations 
+## (one vector at a time, the grid below uses the array versions in vectors3d.py)
 class vector3d: 
     def __init__(self, x, y, z):
         self.x = x 
@@ -35,7 +44,7 @@ class vector3d:
         return vector3d(self.x * scalar, self.y * scalar, self.z * scalar)
     
     def dot(self, otherBody):
-        return self.x * otherBody.x + self.y + otherBody.y + self.z + otherBody.z
+        return self.x * otherBody.x + self.y * otherBody.y + self.z * otherBody.z
 
     def cross(self, otherBody): 
         return vector3d(self.y * otherBody.z - self.z * otherBody.y,
@@ -43,25 +52,126 @@ class vector3d:
                         self.x * otherBody.y - otherBody.x * self.y)
     
     def normalize(self): 
-        length = math.sqrt(self.x **2 + self.y ** 2, self.z ** 2)
+        length = self.length()
 
         if length == 0: 
             return vector3d(0,0,0)
         return(vector3d(self.x / length, self.y / length, self.z / length))
     
     def length(self): 
-        return math.sqrt(self.x **2 + self.y ** 2, self.z ** 2)
+        return math.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
 
-## TODO: Add logic to create a flat flamm paraboloid so that when objects are added it creates a dip and so logic for that as well 
+## flat flamm paraboloid sheet, every mass makes a dip (see curvatureGrid.py); moving,
+## adding or removing a mass only recomputes the grid cells around it
+WIDTH, HEIGHT = 1280, 720
+GRID_SPACING = 16
+grid = FlammGrid(WIDTH, HEIGHT, spacing=GRID_SPACING, G=G, c=C, reach=20, min_reach=80)
 
+## camera: the sheet is tilted away from the viewer and drawn in perspective
+TILT = math.radians(55)
+FOCAL = 900
+DEPTH_SCALE = 0.5
+SCREEN_CENTER = np.array([WIDTH / 2, HEIGHT / 2 + 60])
+PLANE_CENTER = np.array([WIDTH / 2, HEIGHT / 2])
 
+def project(x, y, depth):
+    points = vectors(x - PLANE_CENTER[0], y - PLANE_CENTER[1], depth * DEPTH_SCALE)
+    return perspective(rotate_x(points, TILT), FOCAL, SCREEN_CENTER)
+
+def unproject(screen_pos):
+    ## inverse of project() for a point on the flat (depth 0) sheet, used for mouse clicks
+    u, v = screen_pos[0] - SCREEN_CENTER[0], screen_pos[1] - SCREEN_CENTER[1]
+    denominator = FOCAL * math.cos(TILT) - v * math.sin(TILT)
+    if denominator <= 0:
+        return None  # above the horizon
+    y = v * FOCAL / denominator
+    x = u * (FOCAL + y * math.sin(TILT)) / FOCAL
+    return x + PLANE_CENTER[0], y + PLANE_CENTER[1]
+
+## the masses themselves orbit (and merge) under ordinary gravity
+sim = Simulation(forces=AccelerationEngine(G, min_dist=10), dt=1 / 60, integrator="leapfrog",
+                 constraints=[Accretion()])
+store = sim.store
+next_key = 0
+
+def add_masses(n, seed):
+    ## bodies are keyed by name so the grid can follow them through merges
+    global next_key
+    first = len(store)
+    arrays = belt(n, G, seed=seed, primary_mass=20000, primary_radius=16, inner=120, outer=330,
+                 mass_range=(10, 150))
+    if first:
+        ## keep the one primary we already have
+        arrays.pos, arrays.velocity = arrays.pos[1:], arrays.velocity[1:]
+        arrays.mass, arrays.radius, arrays.colors = arrays.mass[1:], arrays.radius[1:], arrays.colors[1:]
+        arrays.names = None
+    arrays.add_to(store)
+    for i in range(first, len(store)):
+        store.names[i] = f"m{next_key}"
+        next_key += 1
+
+def reset():
+    sim.load(lambda: None)
+    grid.clear()
+    add_masses(150, seed=next_key)
+
+reset()
+font = pygame.font.Font(None, 20)
+paused = False
 
 while running:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_SPACE:
+                paused = not paused
+            elif event.key == pygame.K_r:
+                reset()
+            elif event.key == pygame.K_a:  # 50 more masses in the belt
+                add_masses(50, seed=next_key)
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            spot = unproject(event.pos)
+            if spot is not None and event.button == 1:  # drop a mass where the sheet was clicked
+                store.add(f"m{next_key}", spot, 2000, 10, (0, 0), "lightblue")
+                next_key += 1
+                sim.integrator.reset()
+            elif spot is not None and event.button == 3 and len(store):  # take the nearest mass away
+                nearest = int(np.argmin(np.hypot(*(store.pos - spot).T)))
+                keep = np.ones(len(store), dtype=bool)
+                keep[nearest] = False
+                store.compact(keep)
+                sim.integrator.reset()
 
-        
+    ## only masses that moved more than a pixel get their patch redone
+    moved = grid.sync(store.names[:len(store)], store.pos, store.mass, tolerance=1.0)
     
     screen.fill("black")
+
+    xs, ys = np.meshgrid(grid.xs, grid.ys)
+    mesh = project(xs, ys, grid.depth)
+    for row in mesh:
+        pygame.draw.lines(screen, GRAY, False, row.tolist())
+    for column in mesh.transpose(1, 0, 2):
+        pygame.draw.lines(screen, GRAY, False, column.tolist())
+
+    ## masses sit at the bottom of their dips
+    if len(store):
+        spots = project(store.pos[:, 0], store.pos[:, 1], grid.depth_at(store.pos[:, 0], store.pos[:, 1])).tolist()
+        for spot, radius, color in zip(spots, store.radius.tolist(), store.colors):
+            pygame.draw.circle(screen, color, spot, max(2, radius * 0.8))
+
+    lines = [
+        f"Masses: {len(store)}   grid {grid.shape[1]}x{grid.shape[0]}   updated this frame: {moved}",
+        "SPACE - Pause   R - Reset   A - Add 50 masses   Left click - Add mass   Right click - Remove mass",
+    ]
+    for i, line in enumerate(lines):
+        screen.blit(font.render(line, True, WHITE), (10, 10 + i * 20))
+
     pygame.display.flip()
+
+    dt = clock.tick(60) / 1000
+    if not paused:
+        sim.advance(dt)
+
+pygame.quit()
@@ -0,0 +1,252 @@
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # one banner per worker process otherwise
+
+import argparse
+import csv
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from bodyStore import BodyStore
+from gravityKernels import softened_potential
+from scenes import (G as SCENE_G, create_asteroid_cluster, create_jovian_moon_system, create_kuiper_belt_cluster,
+                    create_random_small_bodies)
+
+## Many small independent runs of the cluster scenes at once, for stability sweeps.
+## Every member (one scene built with its own seed, mass scale and G) gets a row of a
+## batch axis: positions are (members, bodies, 2) and one NumPy pass does the force
+## pass of all of them, so a thousand 10-body systems step about as fast as one
+## 100-body scene. Members with fewer bodies than the widest one are padded with
+## massless, radius-0 bodies that feel forces but exert none and are left out of the
+## summaries. Chunks of members go to a process pool, each worker builds its own
+## members from the (scene, seed, G, mass scale) parameters, so only those and the
+## summaries cross process boundaries.
+##
+## Per member the summary has:
+##   ejections         bodies unbound from the rest and farther than eject_radius from
+##                     the centre of mass at the end
+##   energy_drift      relative total energy change from the start to the end
+##   max_energy_drift  largest |relative change| over the energy samples
+##   closest_approach  smallest centre-to-centre distance of any two bodies, any step
+##
+##   python ensemble.py --members 2000 --steps 600 --out ensemble.csv
+
+ENSEMBLE_SCENES = {
+    "asteroid": create_asteroid_cluster,
+    "kuiper": create_kuiper_belt_cluster,
+    "jovian": create_jovian_moon_system,
+    "random": create_random_small_bodies,
+}
+
+CHUNK = 256  # members per pool task, also bounds a worker's pair arrays to CHUNK x N x N
+SUMMARY_FIELDS = ("member", "scene", "seed", "G", "mass_scale", "bodies", "ejections", "energy_drift",
+                  "max_energy_drift", "closest_approach", "steps")
+
+
+def sweep(scenes, count, seed=0, G_range=(SCENE_G, SCENE_G), mass_range=(1.0, 1.0)):
+    """`count` member parameter sets per scene: scene seed, G and mass scale drawn uniformly"""
+    rng = np.random.default_rng(seed)
+    members = []
+    for scene in scenes:
+        if scene not in ENSEMBLE_SCENES:
+            raise ValueError(f"unknown scene {scene!r}, expected one of {', '.join(ENSEMBLE_SCENES)}")
+        seeds = rng.integers(0, 2 ** 31, count)
+        Gs = rng.uniform(*G_range, count)
+        scales = rng.uniform(*mass_range, count)
+        members.extend({"scene": scene, "seed": int(s), "G": float(g), "mass_scale": float(m)}
+                       for s, g, m in zip(seeds, Gs, scales))
+    for i, member in enumerate(members):
+        member["member"] = i
+    return members
+
+
+def stack(members):
+    """Build every member's scene and pad them into (members, bodies) arrays"""
+    built = []
+    for member in members:
+        store = BodyStore(16)
+        with store.building():
+            ENSEMBLE_SCENES[member["scene"]](seed=member["seed"])
+        built.append(store)
+    width = max(len(store) for store in built)
+    b = len(members)
+    pos, velocity = np.zeros((b, width, 2)), np.zeros((b, width, 2))
+    mass, radius = np.zeros((b, width)), np.zeros((b, width))
+    real = np.zeros((b, width), dtype=bool)
+    for k, (member, store) in enumerate(zip(members, built)):
+        n = len(store)
+        pos[k, :n], velocity[k, :n] = store.pos, store.velocity
+        mass[k, :n], radius[k, :n] = store.mass * member["mass_scale"], store.radius
+        real[k, :n] = True
+    G = np.array([member["G"] for member in members], dtype=np.float64)
+    return pos, velocity, mass, radius, real, G
+
+
+class EnsembleBatch:
+    """Stacked members advanced together, accelerations_from's force law along a batch axis"""
+
+    def __init__(self, pos, velocity, mass, radius, real, G, min_dist=5.0):
+        self.pos, self.velocity = pos, velocity
+        self.mass, self.real, self.G = mass, real, G
+        self.min_dist = min_dist
+        b, n = mass.shape
+        ## nothing but the positions changes, so the clamp and G * m_j are worked out once
+        self.clamp = np.maximum(radius[:, :, np.newaxis] + radius[:, np.newaxis, :], min_dist)
+        self.Gm = G[:, np.newaxis, np.newaxis] * mass[:, np.newaxis, :]
+        pairs = ~np.eye(n, dtype=bool)[np.newaxis] & real[:, :, np.newaxis] & real[:, np.newaxis, :]
+        self._not_pair = np.where(pairs, 0.0, np.inf)  # added to distances so min() skips the rest
+        self.closest = np.full(b, np.inf)
+        self.acc = np.zeros_like(pos)
+        self.steps = 0
+
+    def _offsets(self):
+        ## dx[b, i, j], dy[b, i, j] point from body i to body j of member b
+        x, y = self.pos[..., 0], self.pos[..., 1]
+        dx = x[:, np.newaxis, :] - x[:, :, np.newaxis]
+        dy = y[:, np.newaxis, :] - y[:, :, np.newaxis]
+        return dx, dy, np.sqrt(dx * dx + dy * dy)
+
+    def accelerations(self):
+        """Fill self.acc for every member, and lower self.closest to this pass's closest pairs"""
+        dx, dy, r = self._offsets()
+        b = len(r)
+        np.minimum(self.closest, (r + self._not_pair).reshape(b, -1).min(axis=1), out=self.closest)
+        dist = np.maximum(r, self.clamp)
+        weight = self.Gm / (dist * dist * dist)
+        ## separate x and y sums over (B, N, N) are much quicker than an einsum over (B, N, N, 2)
+        self.acc[..., 0] = (weight * dx).sum(axis=2)
+        self.acc[..., 1] = (weight * dy).sum(axis=2)
+        return self.acc
+
+    def energy(self):
+        """(total energy (B,), potential per unit mass of every body (B, N)) of the clamped force law"""
+        _, _, r = self._offsets()
+        with np.errstate(invalid="ignore"):  # padding bodies sit on top of each other with no mass
+            phi = softened_potential(r, self.clamp, self.mass[:, np.newaxis, :], self.G[:, np.newaxis, np.newaxis])
+        n = r.shape[1]
+        phi[:, np.arange(n), np.arange(n)] = 0.0  # no self energy
+        phi = phi.sum(axis=2)
+        kinetic = 0.5 * np.einsum("bn,bnk,bnk->b", self.mass, self.velocity, self.velocity)
+        return kinetic + 0.5 * np.einsum("bn,bn->b", self.mass, phi), phi
+
+    def step(self, dt, integrator="leapfrog"):
+        if self.steps == 0:
+            self.accelerations()
+        if integrator == "leapfrog":
+            ## kick-drift-kick, reusing the last force pass like integrators.Leapfrog
+            self.velocity += self.acc * (dt / 2)
+            self.pos += self.velocity * dt
+            self.accelerations()
+            self.velocity += self.acc * (dt / 2)
+        elif integrator == "euler":
+            ## semi-implicit Euler, same as BodyStore.integrate
+            self.velocity += self.acc * dt
+            self.pos += self.velocity * dt
+            self.accelerations()
+        else:
+            raise ValueError(f"ensemble runs support 'leapfrog' and 'euler', not {integrator!r}")
+        self.steps += 1
+
+    def ejections(self, phi, eject_radius):
+        """Bodies per member unbound from the rest and farther than eject_radius from its centre of mass"""
+        mass, pos, velocity = self.mass, self.pos, self.velocity
+        total = mass.sum(axis=1, keepdims=True)
+        total[total == 0] = 1.0
+        com = np.einsum("bn,bnk->bk", mass, pos) / total
+        com_velocity = np.einsum("bn,bnk->bk", mass, velocity) / total
+        v = velocity - com_velocity[:, np.newaxis]
+        specific = 0.5 * np.einsum("bnk,bnk->bn", v, v) + phi
+        far = np.hypot(*(pos - com[:, np.newaxis]).transpose(2, 0, 1)) > eject_radius
+        return (self.real & far & (specific > 0)).sum(axis=1)
+
+
+def run_members(members, steps=600, dt=1 / 60, min_dist=5.0, integrator="leapfrog", sample_every=60,
+                eject_radius=1000.0):
+    """Advance a list of members together for `steps` fixed steps, returns their summary rows"""
+    batch = EnsembleBatch(*stack(members), min_dist=min_dist)
+    start_energy, _ = batch.energy()
+    scale = np.where(start_energy != 0, np.abs(start_energy), 1.0)
+    max_drift = np.zeros(len(members))
+    for step in range(1, steps + 1):
+        batch.step(dt, integrator)
+        if step % sample_every == 0 and step != steps:
+            energy, _ = batch.energy()
+            np.maximum(max_drift, np.abs(energy - start_energy) / scale, out=max_drift)
+
+    energy, phi = batch.energy()
+    drift = (energy - start_energy) / scale
+    np.maximum(max_drift, np.abs(drift), out=max_drift)
+    ejections = batch.ejections(phi, eject_radius)
+    rows = []
+    for k, member in enumerate(members):
+        rows.append({**member, "bodies": int(batch.real[k].sum()), "ejections": int(ejections[k]),
+                     "energy_drift": float(drift[k]), "max_energy_drift": float(max_drift[k]),
+                     "closest_approach": float(batch.closest[k]), "steps": steps})
+    return rows
+
+
+def _run_chunk(task):
+    members, options = task
+    return run_members(members, **options)
+
+
+def run_ensemble(members, steps=600, workers=None, chunk=CHUNK, **options):
+    """Run every member in chunks over a process pool (workers <= 1 runs in this process)
+
+    Returns (summary rows in member order, members per second of wall-clock time).
+    """
+    start = time.perf_counter()
+    options["steps"] = steps
+    tasks = [(members[i:i + chunk], options) for i in range(0, len(members), chunk)]
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers <= 1 or len(tasks) == 1:
+        results = [_run_chunk(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            results = pool.map(_run_chunk, tasks)
+    rows = [row for result in results for row in result]
+    elapsed = time.perf_counter() - start
+    return rows, (len(members) / elapsed if elapsed > 0 else float("inf"))
+
+
+def write_summaries(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched stability sweep over the small cluster scenes")
+    parser.add_argument("--scenes", nargs="+", default=["asteroid", "kuiper"], choices=list(ENSEMBLE_SCENES))
+    parser.add_argument("--members", type=int, default=1000, help="members per scene")
+    parser.add_argument("--steps", type=int, default=600, help="fixed 1/60 s steps per member")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the parameter sweep itself")
+    parser.add_argument("--G", type=float, nargs=2, default=(SCENE_G, SCENE_G), metavar=("LOW", "HIGH"))
+    parser.add_argument("--mass-scale", type=float, nargs=2, default=(1.0, 1.0), metavar=("LOW", "HIGH"))
+    parser.add_argument("--integrator", default="leapfrog", choices=("leapfrog", "euler"))
+    parser.add_argument("--workers", type=int, default=None, help="processes, default one per CPU")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="members per process task")
+    parser.add_argument("--out", default="ensemble.csv", help="per-member summaries (CSV)")
+    args = parser.parse_args(argv)
+
+    members = sweep(args.scenes, args.members, args.seed, args.G, args.mass_scale)
+    rows, rate = run_ensemble(members, args.steps, args.workers, args.chunk, integrator=args.integrator)
+    write_summaries(args.out, rows)
+
+    print(f"{len(rows)} members x {args.steps} steps, {rate:,.0f} members/s -> {args.out}")
+    for scene in args.scenes:
+        mine = [row for row in rows if row["scene"] == scene]
+        ejected = sum(row["ejections"] > 0 for row in mine)
+        drift = np.median([abs(row["energy_drift"]) for row in mine])
+        closest = np.median([row["closest_approach"] for row in mine])
+        print(f"{scene:<10} {len(mine):>6} members  {ejected:>6} with ejections  median |drift| {drift:.2e}"
+              f"  median closest approach {closest:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
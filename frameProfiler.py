@@ -0,0 +1,150 @@
+import csv
+import json
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+## Per-phase timing of the demo main loops. Code marks its phases with
+##
+##     with profiler.phase("force"):
+##         ...
+##
+## and the loop calls profiler.end_frame() once per frame. Phases nest and are timed
+## exclusively: time spent in an inner phase (e.g. the force pass inside a simulation
+## step) is not counted again for the outer one ("integrate"), so the phases of a frame
+## add up to the time it took. The last `window` frames are kept per phase for the
+## overlay and histograms, and every frame can also be kept as a trace to dump to CSV
+## or JSON. A disabled profiler hands out one shared no-op context manager, so the
+## marks can stay in the code for good.
+## Each thread nests its own phases (e.g. physicsThread.py steps on one thread while the
+## main loop draws), so with threads the phases of a frame can add up to more than it.
+
+_NO_OP = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start", "inner")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.inner = 0.0
+        self.profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler._stack
+        stack.pop()
+        if stack:
+            stack[-1].inner += elapsed
+        frame = self.profiler._frame
+        frame[self.name] = frame.get(self.name, 0.0) + elapsed - self.inner
+
+
+class FrameProfiler:
+    """Rolling per-phase frame timings, counters and an optional full trace"""
+
+    def __init__(self, window=240, enabled=False, trace=True, max_trace=100_000):
+        self.window = int(window)
+        self.enabled = enabled
+        self.trace = trace  # keep every frame for dump()
+        self.max_trace = max_trace
+        self._local = threading.local()  # per-thread stack of open phases
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.phases = []  # in the order they first showed up
+        self._history = {}  # phase or counter name -> (window,) ms or counts, circular
+        self._frame_ms = np.zeros(self.window)
+        self._frame = {}
+        self._counters = {}
+        self._last_end = None
+        self.rows = []
+
+    @property
+    def _stack(self):
+        ## open phases of the calling thread, innermost last
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def phase(self, name):
+        """Context manager timing one phase of the current frame (a no-op when disabled)"""
+        if not self.enabled:
+            return _NO_OP
+        return _Phase(self, name)
+
+    def count(self, name, value):
+        """Add to a per-frame counter, e.g. pair interactions evaluated"""
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def end_frame(self):
+        """Close the current frame; its wall-clock length runs from the previous end_frame()"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        frame_ms = (now - self._last_end) * 1000 if self._last_end is not None else 0.0
+        self._last_end = now
+        slot = self.frames % self.window
+
+        ## swap the dicts out first, another thread may still be closing a phase into them
+        frame, self._frame = self._frame, {}
+        counters, self._counters = self._counters, {}
+        values = {name: seconds * 1000 for name, seconds in frame.copy().items()}
+        values.update(counters.copy())
+        for name in values:
+            if name not in self._history:
+                self._history[name] = np.zeros(self.window)
+                if name in frame:
+                    self.phases.append(name)
+        for name, history in self._history.items():
+            history[slot] = values.get(name, 0.0)
+        self._frame_ms[slot] = frame_ms
+
+        if self.trace and len(self.rows) < self.max_trace:
+            self.rows.append({"frame": self.frames, "time": now, "frame_ms": frame_ms, **values})
+        self.frames += 1
+
+    def _recent(self, history):
+        return history[:min(self.frames, self.window)]
+
+    def stats(self, name):
+        """(mean, p50, p95, max) of a phase in ms (or a counter) over the window"""
+        recent = self._recent(self._history.get(name, self._frame_ms if name == "frame" else np.zeros(0)))
+        if not len(recent):
+            return 0.0, 0.0, 0.0, 0.0
+        p50, p95 = np.percentile(recent, (50, 95))
+        return float(recent.mean()), float(p50), float(p95), float(recent.max())
+
+    def histogram(self, name, bins=20):
+        """(counts, edges) of a phase's ms over the window"""
+        recent = self._recent(self._frame_ms if name == "frame" else self._history[name])
+        return np.histogram(recent, bins=bins)
+
+    def rate(self, counter):
+        """Counter per second of wall-clock time over the window, e.g. interactions/s"""
+        seconds = self._recent(self._frame_ms).sum() / 1000
+        if counter not in self._history or seconds <= 0:
+            return 0.0
+        return float(self._recent(self._history[counter]).sum() / seconds)
+
+    def dump(self, path):
+        """Write the trace as CSV or JSON (by extension), one row per frame"""
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"phases": self.phases, "frames": self.rows}, f)
+            return
+        columns = ["frame", "time", "frame_ms"] + [name for name in self._history if name not in ("frame", "time")]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, columns, restval=0.0)
+            writer.writeheader()
+            writer.writerows(self.rows)
@@ -0,0 +1,129 @@
+import numpy as np
+
+## Vectorized gravity for the demos. Instead of calling calculate_gravitational_force
+## once per ordered pair (and building a handful of Vector2 temporaries each time),
+## all bodies live in contiguous arrays and every pairwise acceleration is computed
+## in one NumPy pass.
+
+
+def softened_potential(r, clamp, mass, G):
+    """Pair potential per unit mass of the clamped force law, -G m / r outside the clamp
+
+    Inside it the force grows linearly (a = G m d / clamp^3), which is the harmonic
+    core G m (r^2 - 3 clamp^2) / (2 clamp^3); the two meet at r = clamp.
+    """
+    with np.errstate(divide="ignore"):
+        outside = -G * mass / r
+    inside = G * mass * (r * r - 3 * clamp * clamp) / (2 * clamp ** 3)
+    return np.where(r >= clamp, outside, inside)
+
+
+def accelerations_from(target_pos, target_radius, pos, mass, radius, G, min_dist=5.0, potential=None):
+    """Accelerations of some target bodies due to every body in (pos, mass, radius)
+
+    A target that is also a source sits at distance 0 from itself, which contributes
+    nothing, so targets can be any slice of the sources. If `potential` is given it
+    is filled with each target's potential per unit mass from the same distances.
+    """
+    ## d[i, j] points from target i to body j
+    d = pos[np.newaxis, :, :] - target_pos[:, np.newaxis, :]
+    r = np.sqrt(np.einsum("ijk,ijk->ij", d, d))
+
+    # Prevent extreme forces: dist is clamped to max(r_i + r_j, min_dist)
+    clamp = np.maximum(target_radius[:, np.newaxis] + radius[np.newaxis, :], min_dist)
+    dist = np.maximum(r, clamp)
+
+    if potential is not None:
+        phi = softened_potential(r, clamp, mass[np.newaxis, :], G)
+        phi[r == 0] = 0.0  # the target itself
+        phi.sum(axis=1, out=potential)
+
+    ## the original code divides the (unclamped) direction vector by the clamped distance,
+    ## so a_i = G * m_j * d_ij / dist^3 reproduces it exactly
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = G * mass[np.newaxis, :] / dist ** 3
+    weight[~np.isfinite(weight)] = 0.0
+
+    return np.einsum("ij,ijk->ik", weight, d)
+
+
+SUBSET_BLOCK = 256  # targets per accelerations_from call in subset passes, bounds scratch to ~256 x N
+
+
+def subset_accelerations(targets, pos, mass, radius, G, min_dist=5.0, block=SUBSET_BLOCK):
+    """Direct-sum accelerations of the bodies at indices `targets`, a block of targets at a time"""
+    acc = np.empty((len(targets), 2))
+    for start in range(0, len(targets), block):
+        rows = targets[start:start + block]
+        acc[start:start + len(rows)] = accelerations_from(pos[rows], radius[rows], pos, mass, radius, G, min_dist)
+    return acc
+
+
+def direct_accelerations(pos, mass, radius, G, min_dist=5.0, potential=None, targets=None):
+    """All-pairs accelerations, same softening as CelestialBody.calculate_gravitational_force
+
+    With `targets` (indices) only those bodies' accelerations are returned, in that order.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    mass = np.asarray(mass, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    if targets is not None:
+        return subset_accelerations(targets, pos, mass, radius, G, min_dist)
+    return accelerations_from(pos, radius, pos, mass, radius, G, min_dist, potential)
+
+
+direct_accelerations.fills_potential = True
+
+
+def fills_potential(solver):
+    """Whether solver(..., potential=array) also fills in every body's potential per unit mass
+
+    Solvers say so with a `fills_potential` attribute; functools.partial is looked through.
+    """
+    return getattr(getattr(solver, "func", solver), "fills_potential", False)
+
+
+class AccelerationEngine:
+    """Evaluates gravity for every body of a BodyStore at once
+
+    A solver is called as solver(pos, mass, radius, G, min_dist, targets=None); with
+    `targets` (sorted body indices, e.g. the active bodies of a block timestep) it
+    returns just those bodies' accelerations, in that order.
+    """
+
+    def __init__(self, G, min_dist=5.0, solver=direct_accelerations):
+        self.G = G
+        self.min_dist = min_dist
+        self.solver = solver
+        ## while set (see diagnostics.py), full passes of solvers that can (fills_potential)
+        ## also keep the potential of every body and the positions it was computed at,
+        ## as (pos, potential)
+        self.capture_potential = False
+        self.captured = None
+
+    def compute_accelerations(self, store, targets=None):
+        ## positions, masses and radii are read straight out of the store's contiguous
+        ## arrays and the result is written back into its acceleration array
+        if len(store) == 0:
+            return store.acceleration
+        if targets is not None and len(targets) == len(store):
+            targets = None  # every body, e.g. the closing tick of a block step
+        if targets is None:
+            if self.capture_potential and fills_potential(self.solver):
+                potential = np.empty(len(store))
+                store.acceleration[:] = self.solver(store.pos, store.mass, store.radius, self.G, self.min_dist,
+                                                    potential=potential)
+                self.captured = (store.pos.copy(), potential)
+            elif hasattr(self.solver, "accelerate_store"):
+                ## solvers that work on the store itself (ParallelForcePool writes in place)
+                self.solver.accelerate_store(store, self.G, self.min_dist)
+            else:
+                store.acceleration[:] = self.solver(store.pos, store.mass, store.radius, self.G, self.min_dist)
+        elif len(targets):
+            ## only some rows (e.g. the active bodies of a block timestep), by the same solver
+            if hasattr(self.solver, "accelerate_store"):
+                self.solver.accelerate_store(store, self.G, self.min_dist, targets)
+            else:
+                store.acceleration[targets] = self.solver(store.pos, store.mass, store.radius, self.G, self.min_dist,
+                                                          targets=targets)
+        return store.acceleration
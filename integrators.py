@@ -0,0 +1,237 @@
+import numpy as np
+
+## Time integrators over a BodyStore. Every integrator has the same
+## step(store, accelerate, dt) call, where accelerate(store) fills store.acceleration
+## for the current positions (AccelerationEngine.compute_accelerations does exactly that),
+## so a scene can swap schemes without touching anything else. accelerate(store, targets)
+## only refreshes the given rows, which is what the block timestep scheme relies on.
+##
+##   euler     semi-implicit Euler, what update_position/updatePos always did (1st order, 1 eval)
+##   leapfrog  kick-drift-kick velocity Verlet (2nd order, symplectic, 1 eval: last step's is reused)
+##   yoshida4  Yoshida's 4th order composition of leapfrog (symplectic, 3 evals)
+##   rk4       classic Runge-Kutta (4th order, not symplectic, 4 evals)
+##   block     leapfrog with per-body power-of-two timesteps, only bodies in close
+##             encounters take the small steps
+
+
+class SemiImplicitEuler:
+    name = "euler"
+    evaluations = 1
+
+    def reset(self):
+        pass
+
+    def step(self, store, accelerate, dt):
+        accelerate(store)
+        store.integrate(dt)
+
+
+class Leapfrog:
+    """Kick-drift-kick; the closing kick's accelerations open the next step"""
+
+    name = "leapfrog"
+    evaluations = 1
+
+    def __init__(self):
+        self._fresh = False
+
+    def reset(self):
+        ## positions changed behind our back (new scene, collisions, ...)
+        self._fresh = False
+
+    def step(self, store, accelerate, dt):
+        if not self._fresh:
+            accelerate(store)
+        store.velocity[:] += store.acceleration * (dt / 2)
+        store.pos[:] += store.velocity * dt
+        accelerate(store)
+        store.velocity[:] += store.acceleration * (dt / 2)
+        self._fresh = True
+
+
+class Yoshida4:
+    """Three leapfrog substeps with Yoshida's weights, error O(dt^4)"""
+
+    name = "yoshida4"
+    evaluations = 3
+
+    _w1 = 1 / (2 - 2 ** (1 / 3))
+    _w0 = -(2 ** (1 / 3)) * _w1
+    DRIFT = (_w1 / 2, (_w0 + _w1) / 2, (_w0 + _w1) / 2, _w1 / 2)
+    KICK = (_w1, _w0, _w1)
+
+    def reset(self):
+        pass
+
+    def step(self, store, accelerate, dt):
+        for drift, kick in zip(self.DRIFT, self.KICK):
+            store.pos[:] += store.velocity * (drift * dt)
+            accelerate(store)
+            store.velocity[:] += store.acceleration * (kick * dt)
+        store.pos[:] += store.velocity * (self.DRIFT[-1] * dt)
+
+
+class RungeKutta4:
+    name = "rk4"
+    evaluations = 4
+
+    def reset(self):
+        pass
+
+    def step(self, store, accelerate, dt):
+        x0 = store.pos.copy()
+        v0 = store.velocity.copy()
+        dx = np.zeros_like(x0)
+        dv = np.zeros_like(v0)
+
+        ## stage k evaluates at x = x0 + c * dt * k_v, v = v0 + c * dt * k_a of the stage before
+        k_v, k_a = v0, np.zeros_like(v0)
+        for c, weight in ((0.0, 1 / 6), (0.5, 2 / 6), (0.5, 2 / 6), (1.0, 1 / 6)):
+            store.pos[:] = x0 + (c * dt) * k_v
+            k_v = v0 + (c * dt) * k_a
+            k_a = accelerate(store).copy()
+            dx += weight * k_v
+            dv += weight * k_a
+
+        store.pos[:] = x0 + dt * dx
+        store.velocity[:] = v0 + dt * dv
+
+
+class BlockTimestep:
+    """Hierarchical (block) leapfrog: body i steps with dt / 2**level[i]
+
+    Levels come from dt_i <= eta * sqrt(softening_i / |a_i|), where softening_i is
+    the body's own clamp length (2 * radius, at least min_softening) unless a fixed
+    `softening` is given. Every tick of the finest level in use all bodies drift, but
+    only bodies at the start/end of their own step get kicked, and only the ones
+    ending a step have their accelerations recomputed; ticks where no step ends just
+    drift. A body may move to a finer level (up to the finest in use) whenever its
+    step ends and to a coarser one only where the coarser grid lines up, so everyone
+    is synchronised again after dt, where every body gets the level it asks for.
+    """
+
+    name = "block"
+
+    def __init__(self, eta=0.1, softening=None, min_softening=5.0, max_level=8):
+        self.eta = eta
+        self.softening = softening  # None scales it to each body's radius
+        self.min_softening = min_softening
+        self.max_level = max_level
+        self.levels = None
+
+    evaluations = None  # varies from step to step, see Simulation.body_evaluations
+
+    def reset(self):
+        self.levels = None
+
+    def wanted_levels(self, acc, dt, radius):
+        amag = np.sqrt(np.einsum("ij,ij->i", acc, acc))
+        if self.softening is None:
+            softening = np.maximum(2 * radius, self.min_softening)
+        else:
+            softening = self.softening
+        with np.errstate(divide="ignore"):
+            ideal = self.eta * np.sqrt(softening / amag)
+        with np.errstate(divide="ignore"):
+            level = np.ceil(np.log2(dt / ideal))
+        return np.clip(np.nan_to_num(level, nan=0.0, neginf=0.0), 0, self.max_level).astype(np.int64)
+
+    def step(self, store, accelerate, dt):
+        n = len(store)
+        if n == 0:
+            self.levels = None
+            return
+        if self.levels is None or len(self.levels) != n:
+            accelerate(store)
+            self.levels = self.wanted_levels(store.acceleration, dt, store.radius)
+        levels = self.levels
+        pos, velocity, acc, radius = store.pos, store.velocity, store.acceleration, store.radius
+
+        ## finest level anyone asked for at the end of the last step
+        top = int(levels.max())
+        ticks = 1 << top
+        h = dt / ticks
+        for tick in range(ticks):
+            span = np.left_shift(1, top - levels)  # ticks per step of each body
+            starting = np.flatnonzero(tick % span == 0)
+            if len(starting):
+                velocity[starting] += acc[starting] * (h * span[starting] / 2)[:, np.newaxis]
+
+            pos += velocity * h
+
+            ending = np.flatnonzero((tick + 1) % span == 0)
+            if not len(ending):
+                continue
+            accelerate(store, ending)
+            velocity[ending] += acc[ending] * (h * span[ending] / 2)[:, np.newaxis]
+
+            ## new levels for the bodies that just finished a step
+            wanted = self.wanted_levels(acc[ending], dt, radius[ending])
+            if tick + 1 == ticks:
+                levels[ending] = wanted  # everyone ends here, next step can go deeper
+            else:
+                wanted = np.minimum(wanted, top)
+                aligned = (tick + 1) % np.left_shift(1, top - wanted) == 0
+                levels[ending] = np.where((wanted >= levels[ending]) | aligned, wanted, levels[ending])
+        self.levels = levels
+
+
+INTEGRATORS = {cls.name: cls for cls in (SemiImplicitEuler, Leapfrog, Yoshida4, RungeKutta4, BlockTimestep)}
+
+
+def make_integrator(name):
+    """Fresh integrator instance by name (see INTEGRATORS)"""
+    try:
+        return INTEGRATORS[name]()
+    except KeyError:
+        raise ValueError(f"unknown integrator {name!r}, expected one of {sorted(INTEGRATORS)}") from None
+
+
+if __name__ == "__main__":
+    import math
+
+    from bodyStore import BodyStore
+    from diagnostics import total_energy
+    from gravityKernels import AccelerationEngine
+    from scenes import G
+    from simulationEngine import Simulation
+
+    def moon_orbit():
+        ## one light moon on a mildly eccentric orbit around Jupiter from create_jovian_moon_system
+        store = BodyStore.current()
+        store.add("Jupiter", (640, 360), 20000, 35)
+        store.add("Moon", (790, 360), 1, 5, (0, 0.9 * math.sqrt(G * 20000 / 150)))
+
+    ## worst relative energy error over 10 simulated seconds (~8 orbits)
+    duration = 10.0
+    print(f"{'integrator':>10} {'dt':>8} {'force evals':>12} {'max |dE/E|':>12}")
+    for name in INTEGRATORS:
+        for dt in (1 / 30, 1 / 60, 1 / 120):
+            sim = Simulation(forces=AccelerationEngine(G, min_dist=5), dt=dt, integrator=name)
+            sim.load(moon_orbit)
+            e0 = total_energy(sim.store, G, 5)
+            worst = 0.0
+            for _ in range(int(round(duration / dt))):
+                sim.step()
+                worst = max(worst, abs(total_energy(sim.store, G, 5) / e0 - 1))
+            print(f"{name:>10} {dt:>8.4f} {sim.force_evaluations:>12} {worst:>12.2e}")
+
+    ## block timesteps on the clustered Kuiper belt scene (Pluto-Charon), against global
+    ## leapfrog steps small enough to reach similar accuracy
+    import random
+
+    from scenes import create_kuiper_belt_cluster
+
+    duration = 3.0
+    print()
+    print(f"{'integrator':>10} {'dt':>8} {'body evals/s':>13} {'max |dE/E|':>12}")
+    for name, dt in (("leapfrog", 1 / 60), ("leapfrog", 1 / 480), ("leapfrog", 1 / 3840), ("block", 1 / 60)):
+        random.seed(4)
+        sim = Simulation(forces=AccelerationEngine(G, min_dist=5), dt=dt, integrator=name)
+        sim.load(create_kuiper_belt_cluster)
+        e0 = total_energy(sim.store, G, 5)
+        worst = 0.0
+        for _ in range(int(round(duration / dt))):
+            sim.step()
+            worst = max(worst, abs(total_energy(sim.store, G, 5) / e0 - 1))
+        print(f"{name:>10} {dt:>8.5f} {sim.body_evaluations / duration:>13,.0f} {worst:>12.2e}")
@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+
+from gravityKernels import subset_accelerations
+
+## Gravity evaluated once per unordered pair. calculate_gravitational_force works out
+## the distance, the clamp and the force of (i, j) and then does it all again for
+## (j, i); by Newton's 3rd law the second call is just the first one negated, so here
+## each pair's G * d / dist^3 is computed once and handed to both bodies, scaled by the
+## other body's mass and with opposite signs.
+##
+##   apply_pair            one pair of body handles (CelestialBody, GravityBody, ...)
+##   symmetric_python      pure-Python loop over i < j
+##   symmetric_accelerations    every pair i < j as one NumPy pass (N^2 / 2 memory)
+##   tiled_symmetric_accelerations  the same over TILE x TILE blocks of the upper
+##                         triangle, memory bounded independent of N
+##
+## All of them use the clamp of gravityKernels.accelerations_from, dist = max(|d|,
+## r_i + r_j, min_dist), and the array versions have the usual solver signature so
+## they can go straight into AccelerationEngine(solver=...). Halving the work needs
+## every body to be a target, so passes over a subset (targets=...) are plain blocked
+## direct sums.
+
+TILE = 256
+
+
+def apply_pair(body, other, G, min_dist=5.0):
+    """Add the mutual gravity of two bodies to both of their accelerations"""
+    dx = other.pos[0] - body.pos[0]
+    dy = other.pos[1] - body.pos[1]
+    dist = max(math.hypot(dx, dy), body.radius + other.radius, min_dist)
+    scale = G / (dist * dist * dist)
+    a, b = other.mass * scale, body.mass * scale
+    body.acceleration += (dx * a, dy * a)
+    other.acceleration -= (dx * b, dy * b)
+
+
+def symmetric_python(pos, mass, radius, G, min_dist=5.0):
+    """Pairwise loop over plain floats, each pair visited once"""
+    xs, ys = [float(p[0]) for p in pos], [float(p[1]) for p in pos]
+    mass, radius = [float(m) for m in mass], [float(r) for r in radius]
+    n = len(xs)
+    ax, ay = [0.0] * n, [0.0] * n
+    for i in range(n):
+        xi, yi, mi, ri = xs[i], ys[i], mass[i], radius[i]
+        for j in range(i + 1, n):
+            dx = xs[j] - xi
+            dy = ys[j] - yi
+            dist = max(math.sqrt(dx * dx + dy * dy), ri + radius[j], min_dist)
+            scale = G / (dist * dist * dist)
+            a, b = mass[j] * scale, mi * scale
+            ax[i] += dx * a
+            ay[i] += dy * a
+            ax[j] -= dx * b
+            ay[j] -= dy * b
+    return np.column_stack((ax, ay)) if n else np.zeros((0, 2))
+
+
+def _pair_weights(d, r_sum, G, min_dist):
+    ## G / dist^3 for pair offsets d (..., 2) with the clamp applied; with min_dist = 0 two
+    ## coincident radius-0 bodies give 1 / 0, zeroed like in gravityKernels.accelerations_from
+    dist = np.maximum(np.sqrt(np.einsum("...k,...k->...", d, d)), np.maximum(r_sum, min_dist))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = G / dist ** 3
+    return np.where(np.isfinite(weight), weight, 0.0)
+
+
+def symmetric_accelerations(pos, mass, radius, G, min_dist=5.0, targets=None):
+    """All pairs i < j in one pass, each pair's force scattered to both ends"""
+    pos = np.asarray(pos, dtype=np.float64)
+    mass = np.asarray(mass, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    if targets is not None:
+        return subset_accelerations(targets, pos, mass, radius, G, min_dist)
+    n = len(pos)
+    i, j = np.triu_indices(n, 1)
+    d = pos[j] - pos[i]
+    scale = _pair_weights(d, radius[i] + radius[j], G, min_dist)
+    acc = np.empty((n, 2))
+    for k in range(2):
+        acc[:, k] = (np.bincount(i, scale * mass[j] * d[:, k], minlength=n)
+                     - np.bincount(j, scale * mass[i] * d[:, k], minlength=n))
+    return acc
+
+
+def tiled_symmetric_accelerations(pos, mass, radius, G, min_dist=5.0, tile=TILE, targets=None):
+    """symmetric_accelerations over tile x tile blocks, only blocks on or above the diagonal"""
+    pos = np.asarray(pos, dtype=np.float64)
+    mass = np.asarray(mass, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    if targets is not None:
+        return subset_accelerations(targets, pos, mass, radius, G, min_dist, tile)
+    n = len(pos)
+    acc = np.zeros((n, 2))
+    for a in range(0, n, tile):
+        a_end = min(a + tile, n)
+        for b in range(a, n, tile):
+            b_end = min(b + tile, n)
+            d = pos[np.newaxis, b:b_end] - pos[a:a_end, np.newaxis]  # d[i, j] points from a-body i to b-body j
+            scale = _pair_weights(d, radius[a:a_end, np.newaxis] + radius[np.newaxis, b:b_end], G, min_dist)
+            if a == b:
+                ## diagonal block: keep i < j only, the other half is the same pairs again
+                scale = np.triu(scale, 1)
+            acc[a:a_end] += np.einsum("ij,ijk->ik", scale * mass[np.newaxis, b:b_end], d)
+            acc[b:b_end] -= np.einsum("ij,ijk->jk", scale * mass[a:a_end, np.newaxis], d)
+    return acc
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from gravityKernels import direct_accelerations
+
+    ## agreement with the ordered-pair direct sum and time per force pass
+    rng = np.random.default_rng(0)
+    for n in [int(a) for a in sys.argv[1:]] or (100, 1000, 4000):
+        pos = rng.uniform(0, 1280, (n, 2))
+        mass = rng.uniform(800, 3000, n)
+        radius = np.maximum(4, mass // 200)
+        variants = [("direct (ordered pairs)", direct_accelerations), ("symmetric", symmetric_accelerations),
+                    ("tiled symmetric", tiled_symmetric_accelerations)]
+        if n <= 1000:
+            variants.append(("pure Python symmetric", symmetric_python))
+        reference = None
+        for label, solver in variants:
+            start = time.perf_counter()
+            acc = solver(pos, mass, radius, 5000)
+            ms = (time.perf_counter() - start) * 1000
+            reference = acc if reference is None else reference
+            error = np.abs(acc - reference).max() / np.abs(reference).max()
+            print(f"N={n:<6} {label:<24} {ms:9.2f} ms  rel err {error:.1e}")
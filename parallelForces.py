@@ -0,0 +1,193 @@
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from gravityKernels import accelerations_from
+
+## Direct-sum gravity spread over a pool of worker processes. Positions, masses and
+## radii sit in multiprocessing.shared_memory blocks that every worker maps as NumPy
+## arrays, so nothing is pickled per step: a task is just (first target, last target, n)
+## plus the names of the blocks, and each worker writes its slice of the shared
+## acceleration array in place.
+##
+## As an AccelerationEngine solver the pool works on the BodyStore itself
+## (accelerate_store): the first pass moves the store's pos/mass/radius/acceleration
+## columns into shared blocks (BodyStore(allocate=...)), after which the workers read the
+## live columns and write the accelerations straight into the store, no copies either
+## way. Called with plain arrays it copies them into staging blocks of its own.
+##
+## Blocks are attached by name, so a store or staging area that grows just gets new
+## blocks and the pool itself is never restarted. The workers are forked once, in
+## __init__, so create the pool before starting any threads (forking a process with
+## running threads can deadlock the child). Blocks left behind by growth stay mapped
+## until close(); capacities double, so that is at most as much again as the live ones.
+
+TARGET_BLOCK = 256  # targets per task, also bounds each worker's scratch to ~TARGET_BLOCK x N
+WORKER_BLOCKS = 16  # shared blocks a worker keeps mapped, oldest dropped first
+
+_worker = {}  # block name -> (SharedMemory, array over the whole block)
+
+
+def _column(name, capacity, width):
+    ## pool workers share the parent's resource tracker, so the parent alone unlinks the block
+    mapped = _worker.pop(name, None)
+    if mapped is None:
+        if len(_worker) >= WORKER_BLOCKS:
+            del _worker[next(iter(_worker))]
+        shm = shared_memory.SharedMemory(name=name)
+        mapped = shm, np.ndarray(shm.size // 8, dtype=np.float64, buffer=shm.buf)
+    _worker[name] = mapped  # re-inserted, so the dict stays in least recently used order
+    flat = mapped[1][:capacity * width]
+    return flat.reshape(capacity, width) if width > 1 else flat
+
+
+def _compute_block(task):
+    ## rows is a slice of targets, or an array of target indices for a subset pass
+    rows, n, G, min_dist, names, capacity = task
+    pos, mass, radius, acc = (_column(name, capacity, width) for name, width in zip(names, (2, 1, 1, 2)))
+    pos, mass, radius = pos[:n], mass[:n], radius[:n]
+    acc[rows] = accelerations_from(pos[rows], radius[rows], pos, mass, radius, G, min_dist)
+
+
+class ParallelForcePool:
+    """Process pool evaluating the all-pairs sum over shared-memory arrays, usable as a solver"""
+
+    def __init__(self, workers=None, capacity=4096, block=TARGET_BLOCK):
+        self.workers = workers or os.cpu_count() or 1
+        self.block = block
+        self._blocks = {}  # name -> SharedMemory, every block this pool created
+        self._block_at = {}  # address of a block's first byte -> its name
+        self._stores = []  # BodyStores whose columns live in our blocks
+        self.capacity = 0
+        self.arrays = {}
+        self._stage(capacity)
+
+        ## fork keeps the workers from re-running the demo script that created the pool
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self._pool = context.Pool(self.workers)
+
+    def shared_zeros(self, shape):
+        """np.zeros(shape) in a new shared block the workers can map, for BodyStore(allocate=...)"""
+        size = int(np.prod(shape))
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1) * 8)
+        array = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        array.fill(0.0)
+        self._blocks[shm.name] = shm
+        self._block_at[array.ctypes.data] = shm.name
+        return array
+
+    def _stage(self, capacity):
+        ## staging blocks for calls with plain arrays
+        self.capacity = capacity
+        self.arrays = {field: self.shared_zeros((capacity, 2) if field in ("pos", "acc") else capacity)
+                       for field in ("pos", "mass", "radius", "acc")}
+
+    def _dispatch(self, n, G, min_dist, columns, targets=None):
+        names = tuple(self._block_at[column.ctypes.data] for column in columns)
+        capacity = len(columns[0])
+        if targets is None:
+            rows = [slice(start, min(start + self.block, n)) for start in range(0, n, self.block)]
+        else:
+            rows = [targets[start:start + self.block] for start in range(0, len(targets), self.block)]
+        tasks = [(block, n, G, min_dist, names, capacity) for block in rows]
+        self._pool.map(_compute_block, tasks, chunksize=max(1, len(tasks) // (self.workers * 4)))
+
+    def accelerate_store(self, store, G, min_dist=5.0, targets=None):
+        """Force pass for every body of a BodyStore (or the rows `targets`), read from and written into its columns"""
+        if store.allocate != self.shared_zeros:
+            store.use_allocator(self.shared_zeros)  # once per store, copies its columns over
+            self._stores.append(store)
+        if len(store):
+            self._dispatch(len(store), G, min_dist, (store._pos, store._mass, store._radius, store._acceleration),
+                           targets)
+        return store.acceleration
+
+    def __call__(self, pos, mass, radius, G, min_dist=5.0, targets=None):
+        n = len(pos)
+        if n > self.capacity:
+            capacity = self.capacity
+            while capacity < n:
+                capacity *= 2
+            self._stage(capacity)
+
+        arrays = self.arrays
+        arrays["pos"][:n] = pos
+        arrays["mass"][:n] = mass
+        arrays["radius"][:n] = radius
+        self._dispatch(n, G, min_dist, (arrays["pos"], arrays["mass"], arrays["radius"], arrays["acc"]), targets)
+        return arrays["acc"][:n] if targets is None else arrays["acc"][targets]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        ## give the stores private copies before their shared blocks are unmapped
+        for store in self._stores:
+            store.use_allocator(None)
+        self._stores = []
+        self.arrays = {}
+        for shm in self._blocks.values():
+            shm.close()
+            shm.unlink()
+        self._blocks, self._block_at = {}, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def single_core_accelerations(pos, mass, radius, G, min_dist=5.0, block=TARGET_BLOCK):
+    """The same blocked direct sum in this process, the baseline for strong scaling"""
+    acc = np.empty((len(pos), 2))
+    for start in range(0, len(pos), block):
+        end = min(start + block, len(pos))
+        acc[start:end] = accelerations_from(pos[start:end], radius[start:end], pos, mass, radius, G, min_dist)
+    return acc
+
+
+def strong_scaling(n=20000, worker_counts=None, repeats=3, G=5000, seed=0):
+    """Time one force pass at fixed N for several worker counts
+
+    Returns [(workers, seconds, speedup, max_abs_err)], workers = 0 is the in-process baseline.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, 1280, (n, 2))
+    mass = rng.uniform(800, 3000, n)
+    radius = np.maximum(4, mass // 200)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        reference = single_core_accelerations(pos, mass, radius, G)
+    baseline = (time.perf_counter() - start) / repeats
+    rows = [(0, baseline, 1.0, 0.0)]
+
+    if worker_counts is None:
+        cpus = os.cpu_count() or 1
+        worker_counts = [w for w in (1, 2, 4, 8, 16, 32, 64) if w <= cpus]
+    for workers in worker_counts:
+        with ParallelForcePool(workers, capacity=n) as pool:
+            pool(pos, mass, radius, G)  # warm up the workers
+            start = time.perf_counter()
+            for _ in range(repeats):
+                acc = pool(pos, mass, radius, G)
+            elapsed = (time.perf_counter() - start) / repeats
+            error = float(np.abs(acc - reference).max())
+        rows.append((workers, elapsed, baseline / elapsed, error))
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"N = {n}, direct sum, one force pass")
+    for workers, seconds, speedup, error in strong_scaling(n):
+        label = "single core" if workers == 0 else f"{workers} workers"
+        print(f"{label:>12}  {seconds * 1000:9.1f} ms  x{speedup:5.2f}  max err {error:.1e}")
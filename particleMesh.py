@@ -0,0 +1,222 @@
+import math
+
+import numpy as np
+
+from collisions import candidate_pairs
+from gravityKernels import softened_potential
+
+## Particle-mesh gravity for very large, fairly uniform populations. Every pass:
+##
+##   1. deposit the masses on a cells x cells grid with cloud-in-cell weights
+##   2. potential = mass grid convolved with the 1/r Green's function, by FFT on a grid
+##      padded to twice the size, so the images of the periodic FFT never overlap
+##      (isolated boundaries, the scene doesn't wrap round)
+##   3. accelerations = -grad(potential) by central differences, interpolated back to
+##      the bodies with the same cloud-in-cell weights
+##
+## which is O(N + M log M) for M grid cells instead of O(N^2). The grid covers the
+## bounding box of the bodies and its cell size is rounded up to one of a few fixed
+## steps, so the FFT of the Green's function is reused from pass to pass.
+##
+## A mesh can't resolve anything below a couple of cells. On its own the Green's
+## function is the clamped potential of gravityKernels.softened_potential with the
+## clamp at max(min_dist, half a cell), but the cloud-in-cell smoothing still makes
+## close pairs weaker than in the direct sum, and a few far outliers that stretch the
+## grid make every cell coarser. With p3m=True the mesh only carries the smooth long-range
+## part of the force, -erf(r / 2 r_s) / r, and pairs closer than `cutoff` split radii
+## (found with the spatial hash of collisions.py) get the rest directly: the clamped
+## direct force of gravityKernels.accelerations_from minus that long-range part, so
+## the total matches the direct sum up to the mesh error of the long-range part. That
+## is P^3M (particle-particle/particle-mesh); the direct part grows with the number of
+## close pairs, so it is for clustered scenes of moderate size, not 10^6 bodies.
+
+
+def _erf(x):
+    ## Abramowitz & Stegun 7.1.26, |error| < 1.5e-7, NumPy has no erf of its own
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+def long_range_fraction(r, split):
+    """Share of the 1/r^2 force a pair at distance r gets from the erf-split mesh part"""
+    u = r / (2 * split)
+    return _erf(u) - 2 * u / math.sqrt(math.pi) * np.exp(-u * u)
+
+
+class ParticleMesh:
+    """FFT particle-mesh gravity (optionally P^3M) with the usual solver signature"""
+
+    fills_potential = True  # potential=... reads the grid potential back at the bodies
+
+    def __init__(self, cells=256, p3m=False, split=1.25, cutoff=5.0):
+        self.cells = int(cells)  # grid points per side
+        self.p3m = p3m
+        self.split = split  # split radius r_s of the P^3M force split, in cells
+        self.cutoff = cutoff  # direct part covers pairs closer than cutoff * r_s (plus their clamp)
+        self._greens = {}
+        self.cell_size = 0.0
+        self.pairs = 0  # close pairs summed directly in the last pass
+
+    def _cell(self, extent, softening):
+        ## room for the bodies plus two cells on every side, rounded up to 2^(k/4). Cells
+        ## below half the smallest clamp resolve nothing the force law has, and (bodies
+        ## all on top of each other) would turn rounding noise into huge gradients
+        needed = max(extent / (self.cells - 5), softening / 2, 1e-9)
+        return 2.0 ** (math.ceil(4 * math.log2(needed)) / 4)
+
+    def _kernel(self, r, h, min_dist):
+        ## potential of a unit mass at distance r, as the mesh sees it
+        if self.p3m:
+            rs = self.split * h
+            with np.errstate(divide="ignore", invalid="ignore"):
+                kernel = -_erf(r / (2 * rs)) / r
+            return np.where(r > 0, kernel, -1 / (rs * math.sqrt(math.pi)))  # limit at r = 0
+        return softened_potential(r, max(min_dist, h / 2), 1.0, 1.0)
+
+    def _green_fft(self, h, min_dist):
+        key = (h, self.p3m, min_dist)
+        khat = self._greens.get(key)
+        if khat is None:
+            m = 2 * self.cells
+            offsets = np.minimum(np.arange(m), m - np.arange(m)) * h  # distance across the padded, wrapped grid
+            r = np.hypot(offsets[:, np.newaxis], offsets[np.newaxis, :])
+            if len(self._greens) >= 8:
+                self._greens.clear()
+            khat = self._greens[key] = np.fft.rfft2(self._kernel(r, h, min_dist))
+        return khat
+
+    def potential_grid(self, pos, mass, G, min_dist=5.0, radius=None):
+        """(potential per unit mass on the grid, origin, cell size, CIC indices and weights)"""
+        m = self.cells
+        lo, hi = pos.min(axis=0), pos.max(axis=0)
+        ## the closest any pair gets in the force law, max(r_i + r_j, min_dist)
+        softening = max(min_dist, 2 * float(radius.min())) if radius is not None and len(radius) else min_dist
+        h = self._cell(float((hi - lo).max()), softening)
+        origin = (lo + hi) / 2 - (m - 1) * h / 2
+        g = (pos - origin) / h
+        i0 = np.floor(g).astype(np.int64)
+        f = g - i0
+        ix, iy = i0[:, 0], i0[:, 1]
+        fx, fy = f[:, 0], f[:, 1]
+        corners = (((ix, iy), (1 - fx) * (1 - fy)), ((ix + 1, iy), fx * (1 - fy)),
+                   ((ix, iy + 1), (1 - fx) * fy), ((ix + 1, iy + 1), fx * fy))
+
+        ## cloud in cell: every body spreads its mass over the 4 surrounding grid points
+        rho = np.zeros(m * m)
+        for (cx, cy), w in corners:
+            rho += np.bincount(cx * m + cy, w * mass, minlength=m * m)
+        padded = np.zeros((2 * m, 2 * m))
+        padded[:m, :m] = rho.reshape(m, m)
+        phi = np.fft.irfft2(np.fft.rfft2(padded) * self._green_fft(h, min_dist), s=padded.shape)[:m, :m] * G
+        self.cell_size = h
+        return phi, origin, h, corners
+
+    def __call__(self, pos, mass, radius, G, min_dist=5.0, targets=None, potential=None):
+        """Accelerations (of the bodies at `targets` if given); `potential`, if given (and
+        targets isn't), is filled with every body's potential per unit mass on the way"""
+        pos = np.asarray(pos, dtype=np.float64)
+        mass = np.asarray(mass, dtype=np.float64)
+        radius = np.asarray(radius, dtype=np.float64)
+        n = len(pos)
+        acc = np.zeros((n if targets is None else len(targets), 2))
+        if n < 2 or not len(acc):
+            return acc
+        ## every body goes on the grid, only the targets read their force back off it
+        phi, origin, h, corners = self.potential_grid(pos, mass, G, min_dist, radius)
+        gx, gy = np.gradient(phi, h)
+        m = self.cells
+        gx, gy = gx.ravel(), gy.ravel()
+        for (cx, cy), w in corners:
+            if targets is not None:
+                cx, cy, w = cx[targets], cy[targets], w[targets]
+            flat = cx * m + cy
+            acc[:, 0] -= w * gx[flat]
+            acc[:, 1] -= w * gy[flat]
+        if potential is not None:
+            self._body_potential(potential, phi, corners, (pos - origin) / h, mass, G, h, min_dist)
+        if self.p3m:
+            short = self._short_range(pos, mass, radius, G, min_dist, self.split * h, targets, potential)
+            acc += short if targets is None else short[targets]
+        return acc
+
+    def _body_potential(self, out, phi, corners, g, mass, G, h, min_dist):
+        ## the grid potential read back with the same weights, minus what every body's
+        ## own cloud adds at its position: sum over its corner pairs of w_a w_b K(a - b)
+        m = self.cells
+        phi = phi.ravel()
+        out[:] = 0.0
+        for (cx, cy), w in corners:
+            out += w * phi[cx * m + cy]
+        fx, fy = g[:, 0] - np.floor(g[:, 0]), g[:, 1] - np.floor(g[:, 1])
+        same_x, next_x = fx * fx + (1 - fx) ** 2, 2 * fx * (1 - fx)
+        same_y, next_y = fy * fy + (1 - fy) ** 2, 2 * fy * (1 - fy)
+        k0, k1, k2 = self._kernel(np.array((0.0, h, h * math.sqrt(2))), h, min_dist)
+        out -= G * mass * (same_x * same_y * k0 + (next_x * same_y + same_x * next_y) * k1 + next_x * next_y * k2)
+
+    def _short_range(self, pos, mass, radius, G, min_dist, rs, targets=None, potential=None):
+        ## direct minus mesh force for every close pair, each pair once and given to both ends
+        reach = self.cutoff * rs
+        i, j = candidate_pairs(pos, radius, cell_size=2 * radius.max() + reach, margin=reach)
+        n = len(pos)
+        if targets is not None and len(i):
+            ## pairs with a target at either end, the rows of the others are never read
+            wanted = np.zeros(n, dtype=bool)
+            wanted[targets] = True
+            keep = wanted[i] | wanted[j]
+            i, j = i[keep], j[keep]
+        self.pairs = len(i)
+        if not len(i):
+            return np.zeros((n, 2))
+        d = pos[j] - pos[i]
+        r = np.sqrt(np.einsum("ij,ij->i", d, d))
+        dist = np.maximum(r, np.maximum(radius[i] + radius[j], min_dist))
+        ## (1 - S(r)) / r^3 goes to 1 / (6 sqrt(pi) r_s^3) as r -> 0
+        tiny = r < 1e-3 * rs
+        safe = np.where(tiny, rs, r)
+        mesh = np.where(tiny, 1 / (6 * math.sqrt(math.pi) * rs ** 3), long_range_fraction(safe, rs) / safe ** 3)
+        scale = G * (1 / dist ** 3 - mesh)
+        if potential is not None:
+            ## the clamped direct potential minus the long-range part the mesh already has
+            clamp = np.maximum(radius[i] + radius[j], min_dist)
+            long_range = np.where(tiny, 1 / (rs * math.sqrt(math.pi)), _erf(safe / (2 * rs)) / safe)
+            pair = softened_potential(r, clamp, 1.0, G) + G * long_range
+            potential += np.bincount(i, pair * mass[j], minlength=n) + np.bincount(j, pair * mass[i], minlength=n)
+        acc = np.empty((n, 2))
+        for k in range(2):
+            acc[:, k] = (np.bincount(i, scale * mass[j] * d[:, k], minlength=n)
+                         - np.bincount(j, scale * mass[i] * d[:, k], minlength=n))
+        return acc
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from gravityKernels import direct_accelerations
+    from parallelForces import single_core_accelerations
+
+    ## error against the direct sum (where that is affordable) and time per pass
+    rng = np.random.default_rng(0)
+    for n in [int(a) for a in sys.argv[1:]] or (2000, 20_000, 1_000_000):
+        pos = rng.uniform((100, 100), (1180, 620), (n, 2))  # create_random_small_bodies, n bodies
+        mass = rng.uniform(800, 3000, n) * 12 / n
+        radius = np.full(n, 1.0)
+        reference = None
+        if n <= 20_000:
+            reference = (direct_accelerations if n <= 2000 else single_core_accelerations)(pos, mass, radius, 5000)
+        for label, solver in (("mesh", ParticleMesh()), ("mesh 512", ParticleMesh(512)),
+                              ("P3M", ParticleMesh(p3m=True))):
+            if label == "P3M" and n > 100_000:
+                continue
+            solver(pos, mass, radius, 5000)  # Green's function FFT
+            start = time.perf_counter()
+            acc = solver(pos, mass, radius, 5000)
+            ms = (time.perf_counter() - start) * 1000
+            line = f"N={n:<8} {label:<9} {ms:9.1f} ms  cell {solver.cell_size:.2f}"
+            if reference is not None:
+                error = np.median(np.linalg.norm(acc - reference, axis=1) / np.linalg.norm(reference, axis=1))
+                line += f"  median rel err {error:.1e}"
+            print(line)
@@ -0,0 +1,238 @@
+import threading
+import time
+
+import numpy as np
+
+from trailBuffer import TrailBuffer
+
+## Physics and drawing on separate threads. The demo loops step the simulation and then
+## draw, one after the other, so a slow force pass costs frames and a slow draw costs
+## steps. A PhysicsThread steps a Simulation against the wall clock on its own thread
+## and after every step publishes a Snapshot: copies of the positions
+## and of whatever the renderer needs (radii, colors, names, trails). Snapshots come
+## from a small pool: the thread fills one that nobody is using without taking the
+## snapshot lock and only swaps it in under that lock, so the renderer never sees a
+## half-written state. Trails are synced incrementally (TrailBuffer.sync_from), so a
+## publish copies the trail slots recorded since that snapshot was last filled, not
+## the whole history.
+##
+## The renderer calls frame() once per display frame, which picks the last two
+## snapshots under the lock (marking them as being read, so publishing leaves them
+## alone) and then, with the lock released, blends them for a point one snapshot
+## interval in the past (so there is always a newer snapshot to move towards) into a
+## Frame of its own. Drawing that frame needs no lock at all. NumPy kernels release
+## the GIL, so the force pass and the blits overlap.
+##
+## Anything that changes the simulation from the UI (loading a scene, switching the
+## solver or integrator, restoring a snapshot) goes through `with physics.edit() as sim:`,
+## which waits for the current step to finish and republishes afterwards.
+
+
+class Snapshot:
+    """Copy of the state one step left behind, reused from publish to publish"""
+
+    def __init__(self):
+        self.time = 0.0
+        self.steps = 0
+        self.wall = 0.0  # perf_counter() when it was published
+        self.count = 0
+        self.pos = np.zeros((0, 2))
+        self.radius = np.zeros(0)
+        self.colors = []
+        self.names = []
+        self.trails = None
+
+    def fill(self, sim, wall):
+        store = sim.store
+        n = len(store)
+        if len(self.pos) < n:
+            ## grow like the store does, publishing never allocates in steady state
+            capacity = max(n, 2 * len(self.pos), 64)
+            self.pos, self.radius = np.zeros((capacity, 2)), np.zeros(capacity)
+        self.pos[:n] = store.pos
+        self.radius[:n] = store.radius
+        self.colors = store.colors[:n]
+        self.names = store.names[:n]
+        self.count = n
+        self.time, self.steps, self.wall = sim.time, sim.steps, wall
+        if sim.trails is not None:
+            if self.trails is None:
+                self.trails = TrailBuffer(sim.trails.length, sim.trails.capacity, sim.trails.every)
+            self.trails.sync_from(sim.trails)
+        else:
+            self.trails = None
+
+
+class Frame:
+    """What the renderer draws: store-like (pos, radius, colors, names, len) plus trails"""
+
+    def __init__(self):
+        self._pos = np.zeros((0, 2))
+        self._radius = np.zeros(0)
+        self.count = 0
+        self.colors = []
+        self.names = []
+        self.trails = None
+        self.time = 0.0
+        self.steps = 0
+        self.alpha = 1.0  # how far between the two snapshots this frame was blended
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def pos(self):
+        return self._pos[:self.count]
+
+    @property
+    def radius(self):
+        return self._radius[:self.count]
+
+    def blend(self, previous, latest, alpha):
+        n = latest.count
+        if len(self._pos) < n:
+            capacity = max(n, 2 * len(self._pos), 64)
+            self._pos, self._radius = np.zeros((capacity, 2)), np.zeros(capacity)
+        pos = self._pos[:n]
+        if previous.count == n and alpha < 1.0:
+            ## previous + alpha * (latest - previous), in place
+            np.subtract(latest.pos[:n], previous.pos[:n], out=pos)
+            pos *= alpha
+            pos += previous.pos[:n]
+        else:
+            ## bodies merged or were added in between, nothing sensible to blend
+            pos[:] = latest.pos[:n]
+            alpha = 1.0
+        self._radius[:n] = latest.radius[:n]
+        self.count = n
+        self.colors, self.names = latest.colors, latest.names
+        if latest.trails is not None:
+            if self.trails is None:
+                self.trails = TrailBuffer(latest.trails.length, latest.trails.capacity, latest.trails.every)
+            self.trails.sync_from(latest.trails)
+        else:
+            self.trails = None
+        self.time = previous.time + alpha * (latest.time - previous.time)
+        self.steps = latest.steps
+        self.alpha = alpha
+
+
+class PhysicsThread:
+    """Runs a Simulation in real time on a background thread and hands out interpolated frames"""
+
+    def __init__(self, sim, idle=0.001):
+        self.sim = sim
+        self.idle = idle  # seconds to sleep when no step is due yet
+        self.paused = False
+        self.steps_per_second = 0.0  # physics steps actually taken, measured over the last second
+        self._lock = threading.Lock()  # guards which snapshots are previous/latest/being read
+        self._sim_lock = threading.RLock()  # held while the thread (or an edit()) touches sim
+        ## previous, latest, the pair frame() may still be blending and one to fill
+        self._pool = [Snapshot() for _ in range(5)]
+        self._previous = self._latest = self._pool[0]
+        self._reading = ()  # the snapshots frame() is blending right now
+        self._frame = Frame()
+        self._stop = threading.Event()
+        self._thread = None
+        self.publish(reset=True)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="physics", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def publish(self, reset=False):
+        """Copy the simulation's state into a free snapshot and swap it in
+
+        reset=True makes it both snapshots, so the next frames show it as is
+        instead of blending from whatever came before.
+        """
+        with self._sim_lock:
+            with self._lock:
+                busy = (self._previous, self._latest, *self._reading)
+                back = next(snapshot for snapshot in self._pool if snapshot not in busy)
+            back.fill(self.sim, time.perf_counter())
+            with self._lock:
+                self._previous, self._latest = (back if reset else self._latest), back
+
+    def edit(self):
+        """Context manager giving the simulation to the caller between two steps"""
+        return _Edit(self)
+
+    def _run(self):
+        ## same pacing as Simulation.advance(), but one step per lock and per snapshot so
+        ## edits get in between steps and slow scenes still publish every step
+        sim = self.sim
+        last = time.perf_counter()
+        behind = 0.0  # wall-clock seconds not simulated yet
+        rate_start, rate_steps = last, 0
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if not self.paused:
+                behind += now - last
+            last = now
+            if now - rate_start >= 1.0:
+                self.steps_per_second = rate_steps / (now - rate_start)
+                rate_start, rate_steps = now, 0
+            if behind < sim.dt:
+                time.sleep(min(self.idle, sim.dt - behind))
+                continue
+            with self._sim_lock:
+                sim.step()
+            self.publish()
+            rate_steps += 1
+            behind -= sim.dt
+            if behind > sim.max_catch_up * sim.dt:
+                ## too slow to keep up: drop the backlog instead of spiralling
+                behind = 0.0
+
+    def frame(self, now=None):
+        """State to draw now, blended between the last two snapshots"""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            previous, latest = self._previous, self._latest
+            self._reading = (previous, latest)
+        span = latest.wall - previous.wall
+        alpha = 1.0
+        if span > 0 and not self.paused:
+            ## the display runs one snapshot interval behind physics, so it moves from
+            ## previous to latest while the next snapshot is being computed
+            alpha = min(max((now - latest.wall) / span, 0.0), 1.0)
+        try:
+            self._frame.blend(previous, latest, alpha)
+        finally:
+            with self._lock:
+                self._reading = ()
+        return self._frame
+
+
+class _Edit:
+    __slots__ = ("physics",)
+
+    def __init__(self, physics):
+        self.physics = physics
+
+    def __enter__(self):
+        self.physics._sim_lock.acquire()
+        return self.physics.sim
+
+    def __exit__(self, *exc):
+        try:
+            ## the edit may have replaced every body, don't blend across it
+            self.physics.publish(reset=True)
+        finally:
+            self.physics._sim_lock.release()
@@ -0,0 +1,309 @@
+import math
+import time
+
+import numpy as np
+import pygame
+
+from camera import ViewIndex
+
+## Batched drawing for the demos. CelestialBody.draw builds a faded Color and calls
+## pygame.draw.circle once per trail point, and every label/HUD line makes a new Font
+## each frame. Here trail dots and bodies are small pre-rendered circle sprites that go
+## to the screen in one Surface.blits call, fade palettes are worked out once per
+## (color, radius, trail length), and fonts and rendered text are cached. Given a
+## Camera (camera.py) it draws only what is in view, with less detail when zoomed out.
+##
+## Sprite memory is bounded: sprites are cached least recently used first up to
+## SPRITE_BYTES, bodies drawn bigger than SPRITE_MAX_RADIUS pixels skip the sprites and
+## go through pygame.draw.circle (clipped to the screen), and zoomed trail palettes are
+## keyed by a few radius buckets instead of every radius a zoom level produces.
+
+SPRITE_MAX_RADIUS = 64  # pixels, larger bodies are drawn as plain circles
+SPRITE_BYTES = 32 << 20  # cached sprite surfaces, RGBA
+
+
+def palette_radius(radius):
+    """Zoomed trail radius rounded to a palette bucket: half pixels up to 8, then 8 steps per doubling"""
+    if radius <= 8:
+        return round(radius * 2) / 2
+    return min(round(2 ** (round(8 * math.log2(radius)) / 8), 1), SPRITE_MAX_RADIUS)
+
+
+class FontCache:
+    """Keeps one Font per size and remembers rendered text surfaces"""
+
+    def __init__(self, max_texts=512):
+        self.fonts = {}
+        self.texts = {}
+        self.max_texts = max_texts
+
+    def font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(None, size)
+        return self.fonts[size]
+
+    def render(self, text, color, size):
+        key = (text, str(color), size)
+        surface = self.texts.get(key)
+        if surface is None:
+            ## changing HUD lines (counters etc.) would grow this forever, start over when full
+            if len(self.texts) >= self.max_texts:
+                self.texts.clear()
+            surface = self.font(size).render(text, True, color)
+            self.texts[key] = surface
+        return surface
+
+
+class Renderer:
+    """Draws bodies, trails, labels and the HUD, and times how long that takes"""
+
+    def __init__(self, screen, trail_style="sprites", trail_fade=0.6, label_min_radius=8, label_zoom=0.6,
+                 trail_zoom=0.25, label_count=200, trail_count=500, density_count=20_000):
+        self.screen = screen
+        self.trail_style = trail_style  # "sprites" (faded dots) or "lines" (one polyline per body)
+        self.trail_fade = trail_fade
+        self.label_min_radius = label_min_radius
+        ## level of detail with a camera: labels are dropped below label_zoom or with more than
+        ## label_count bodies in view, trails below trail_zoom or past trail_count, and more
+        ## than density_count visible bodies (or sub-pixel ones) become an image
+        self.label_zoom, self.label_count = label_zoom, label_count
+        self.trail_zoom, self.trail_count = trail_zoom, trail_count
+        self.density_count = density_count
+        self.index = ViewIndex()
+        self.visible = 0  # bodies drawn by the last draw_bodies
+        self.lod = "full"
+        self._density = None
+        self.fonts = FontCache()
+        self._sprites = {}  # (rgb, radius) -> surface, least recently used first
+        self._sprite_bytes = 0
+        self._palettes = {}
+        self._colors = {}
+        self.draw_ms = 0.0
+
+    def _rgb(self, color):
+        rgb = self._colors.get(color)
+        if rgb is None:
+            c = pygame.Color(color)
+            rgb = self._colors[color] = (c.r, c.g, c.b)
+        return rgb
+
+    def sprite(self, rgb, radius):
+        """Filled circle of the given color, blitted with its top left at (x - radius - 1, y - radius - 1)
+
+        Meant for radii up to SPRITE_MAX_RADIUS, the cache drops the least recently used
+        sprites once they pass SPRITE_BYTES.
+        """
+        key = (rgb, radius)
+        surface = self._sprites.pop(key, None)
+        if surface is None:
+            size = 2 * radius + 2
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(surface, rgb, (radius + 1, radius + 1), radius)
+            self._sprite_bytes += 4 * size * size
+            while self._sprite_bytes > SPRITE_BYTES and self._sprites:
+                oldest = self._sprites.pop(next(iter(self._sprites)))
+                self._sprite_bytes -= 4 * oldest.get_width() * oldest.get_height()
+        self._sprites[key] = surface  # re-inserted, so the dict stays in least recently used order
+        return surface
+
+    def palette(self, color, radius, count):
+        """Sprites and offsets for trail points 1..count-1, same fade as CelestialBody.draw"""
+        key = (color, radius, count)
+        palette = self._palettes.get(key)
+        if palette is None:
+            r, g, b = self._rgb(color)
+            sprites, offsets = [], []
+            for i in range(1, count):
+                alpha = i / count
+                trail_radius = max(1, int(radius * alpha * 0.3))
+                fade = alpha * self.trail_fade
+                sprites.append(self.sprite((int(r * fade), int(g * fade), int(b * fade)), trail_radius))
+                offsets.append(trail_radius + 1)
+            if len(self._palettes) >= 4096:
+                self._palettes.clear()  # zooming through many radii, start over
+            palette = self._palettes[key] = (sprites, np.array(offsets, dtype=np.float64)[:, np.newaxis])
+        return palette
+
+    def draw_bodies(self, store, trails=None, camera=None):
+        """Draw the bodies of a BodyStore (and their trails) with batched blits
+
+        With a Camera only bodies inside its viewport are drawn (found through a
+        ViewIndex), and the level of detail drops with the zoom: labels go first, then
+        trails, and once bodies are smaller than a pixel or very many are visible they
+        become a density image.
+        """
+        start = time.perf_counter()
+        screen = self.screen
+        n = len(store)
+        radius = store.radius
+        colors = store.colors
+        zoom = 1.0 if camera is None else camera.zoom
+
+        if camera is None:
+            visible = np.arange(n)
+            pos = store.pos
+        else:
+            lo, hi = camera.viewport(margin=float(radius.max()) if n else 0.0)
+            ## the index is only re-sorted once bodies have moved about half a grid cell
+            visible = self.index.update(store.pos).query(lo, hi)
+            ## np.take rather than fancy indexing, several times faster for (N, 2) rows
+            world = np.take(store.pos, visible, axis=0)
+            x, y = world[:, 0], world[:, 1]
+            inside = (x >= lo[0]) & (x <= hi[0]) & (y >= lo[1]) & (y <= hi[1])
+            if not inside.all():
+                visible, world = visible[inside], world[inside]
+            pos = camera.to_screen(world)
+        self.visible = len(visible)
+
+        ## a sample is plenty to tell whether the bodies are below a pixel
+        if camera is not None and len(visible) and (len(visible) > self.density_count
+                                                    or float(np.median(radius[visible[:1024]])) * zoom < 1):
+            self.draw_density(pos)
+            self.lod = "density"
+            self.draw_ms = (time.perf_counter() - start) * 1000
+            return self.draw_ms
+
+        self.lod = "full"
+        if camera is not None:
+            if zoom < self.trail_zoom or len(visible) > self.trail_count:
+                self.lod = "bodies"
+            elif zoom < self.label_zoom or len(visible) > self.label_count:
+                self.lod = "trails"
+        scaled = radius[visible] * zoom
+        visible_list = visible.tolist()
+        if trails is not None and self.lod != "bodies":
+            if camera is not None:
+                lo, hi = camera.viewport()
+            if self.trail_style == "lines":
+                for i in visible_list:
+                    trail = trails.history(i)
+                    if len(trail) > 1:
+                        runs = [trail]
+                        if camera is not None:
+                            ## like the dots, only segments with an end in the viewport are drawn
+                            inside = np.all((trail >= lo) & (trail <= hi), axis=1)
+                            if not inside.all():
+                                keep = np.concatenate(([False], inside[:-1] | inside[1:], [False]))
+                                edges = np.flatnonzero(np.diff(keep)).tolist()
+                                runs = [trail[s:e + 1] for s, e in zip(edges[::2], edges[1::2])]
+                        r, g, b = self._rgb(colors[i])
+                        fade = self.trail_fade * 0.5
+                        for run in runs:
+                            if camera is not None:
+                                run = camera.to_screen(run)
+                            pygame.draw.lines(screen, (int(r * fade), int(g * fade), int(b * fade)), False,
+                                              run.tolist())
+            else:
+                batch = []
+                for k, i in enumerate(visible_list):
+                    trail = trails.history(i)
+                    if len(trail) > 1:
+                        trail_radius = float(scaled[k])
+                        if camera is not None:
+                            ## palettes are cached per radius, so the zoomed radius goes to a bucket
+                            trail_radius = palette_radius(trail_radius)
+                        sprites, offsets = self.palette(colors[i], trail_radius, len(trail))
+                        points = trail[1:]
+                        if camera is not None:
+                            ## trail dots that left the viewport are skipped, not just clipped
+                            keep = np.all((points >= lo) & (points <= hi), axis=1)
+                            points = camera.to_screen(points)
+                            if not keep.all():
+                                keep_list = np.flatnonzero(keep).tolist()
+                                points = points[keep]
+                                sprites = [sprites[j] for j in keep_list]
+                                offsets = offsets[keep]
+                        batch.extend(zip(sprites, (points - offsets).tolist()))
+                screen.blits(batch, doreturn=False)
+
+        ## bodies last so they sit on top of every trail
+        body_radius = np.maximum(np.rint(scaled).astype(np.int64), 1)
+        big = np.flatnonzero(body_radius > SPRITE_MAX_RADIUS)
+        if len(big):
+            ## too big for a sprite, drawn first so the small bodies stay on top. A circle
+            ## reaching the farthest screen corner already covers the screen, so the radius
+            ## is clamped to that
+            width, height = screen.get_size()
+            centres = pos[big]
+            far = np.hypot(np.maximum(centres[:, 0], width - centres[:, 0]),
+                           np.maximum(centres[:, 1], height - centres[:, 1]))
+            clamped = np.minimum(body_radius[big], np.ceil(far) + 1).tolist()
+            for k, centre, r in zip(big.tolist(), centres.tolist(), clamped):
+                pygame.draw.circle(screen, self._rgb(colors[visible_list[k]]), centre, r)
+        corners = (pos - (body_radius + 1)[:, np.newaxis]).tolist()
+        body_radius = body_radius.tolist()
+        screen.blits([(self.sprite(self._rgb(colors[i]), body_radius[k]), corners[k])
+                      for k, i in enumerate(visible_list) if body_radius[k] <= SPRITE_MAX_RADIUS],
+                     doreturn=False)
+
+        if self.lod == "full":
+            names = store.names
+            for k in np.flatnonzero(radius[visible] > self.label_min_radius).tolist():
+                i = visible_list[k]
+                if names[i]:
+                    text = self.fonts.render(names[i], colors[i], 16)
+                    screen.blit(text, text.get_rect(center=(pos[k, 0], pos[k, 1] + scaled[k] + 12)))
+
+        self.draw_ms = (time.perf_counter() - start) * 1000
+        return self.draw_ms
+
+    def draw_density(self, screen_pos, tint=(255, 230, 180)):
+        """Bodies as a brightness image, one count per screen pixel on a log scale"""
+        width, height = self.screen.get_size()
+        if self._density is None or self._density.get_size() != (width, height):
+            self._density = pygame.Surface((width, height), 0, 32)
+            self._density_lit = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        x = screen_pos[:, 0].astype(np.int64)
+        y = screen_pos[:, 1].astype(np.int64)
+        on = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        ## counts of the lit pixels only, the image costs what the visible bodies cost:
+        ## last frame's pixels are cleared, this frame's set, and only their bounding box
+        ## is blitted
+        pixels, counts = np.unique(x[on] * height + y[on], return_counts=True)
+        rgb = pygame.surfarray.pixels3d(self._density)
+        rgb[self._density_lit] = 0
+        px, py = pixels // height, pixels % height
+        self._density_lit = (px, py)
+        if not len(pixels):
+            return
+        level = np.log1p(counts) / np.log1p(counts.max())
+        rgb[px, py] = (level[:, np.newaxis] * np.array(tint, dtype=np.float64)).astype(np.uint8)
+        del rgb  # unlocks the surface
+        x0, y0 = int(px.min()), int(py.min())
+        area = pygame.Rect(x0, y0, int(px.max()) - x0 + 1, int(py.max()) - y0 + 1)
+        self.screen.blit(self._density, area.topleft, area, special_flags=pygame.BLEND_ADD)
+
+    def draw_hud(self, title, lines, highlight="PAUSED"):
+        """Title plus a column of status lines, each rendered once and reused"""
+        self.screen.blit(self.fonts.render(title, "yellow", 24), (10, 10))
+        for i, line in enumerate(lines):
+            color = "yellow" if highlight and highlight in line else "white"
+            self.screen.blit(self.fonts.render(line, color, 20), (10, 40 + i * 20))
+
+    def draw_profile(self, profiler, x=None, y=10, width=260):
+        """FrameProfiler overlay: ms per phase (mean and p95) with bars, interactions/s and a frame time histogram"""
+        screen = self.screen
+        x = screen.get_width() - width - 10 if x is None else x
+        budget = 1000 / 60  # a full bar is one 60 fps frame
+        lines = [("frame", *profiler.stats("frame"))] + [(name, *profiler.stats(name)) for name in profiler.phases]
+        for row, (name, mean, _, p95, _) in enumerate(lines):
+            top = y + row * 18
+            pygame.draw.rect(screen, (40, 90, 40), (x, top + 2, int(min(mean / budget, 1) * width), 14))
+            text = f"{name:<12} {mean:6.2f} ms  p95 {p95:6.2f}"
+            screen.blit(self.fonts.render(text, "white", 18), (x + 4, top))
+
+        top = y + len(lines) * 18 + 4
+        rate = profiler.rate("interactions")
+        screen.blit(self.fonts.render(f"interactions/s {rate:,.0f}", "white", 18), (x + 4, top))
+
+        if profiler.frames:
+            counts, edges = profiler.histogram("frame", bins=32)
+            top += 22
+            height = 40
+            bar = width / len(counts)
+            tallest = max(counts.max(), 1)
+            for k, c in enumerate(counts):
+                h = int(height * c / tallest)
+                pygame.draw.rect(screen, (90, 90, 160), (x + int(k * bar), top + height - h, max(1, int(bar) - 1), h))
+            label = f"frame ms {edges[0]:.1f} .. {edges[-1]:.1f}"
+            screen.blit(self.fonts.render(label, "gray", 16), (x + 4, top + height + 2))
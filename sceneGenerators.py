@@ -0,0 +1,160 @@
+import math
+
+import numpy as np
+
+from bodyStore import BodyStore
+
+## Seeded scene generators that make initial conditions as whole arrays. The hand-built
+## scenes in scenes.py draw from the global `random` one body at a time and create a
+## CelestialBody per body, which is fine for a dozen bodies but takes seconds at a
+## million and never gives the same scene twice. Everything here draws from its own
+## np.random.default_rng(seed), so the same arguments always give the same bodies, and
+## goes into the store with one BodyStore.extend call.
+##
+## Orbits use the same circular speed sqrt(G * M / r) as create_jovian_moon_system,
+## perpendicular to the radius the same way: (-sin, cos) * speed.
+
+CENTER = (640, 360)
+PALETTE = ["white", "gray", "brown", "orange", "yellow", "lightblue", "red", "purple"]
+_PALETTE = np.array(PALETTE, dtype=object)
+
+
+class SceneArrays:
+    """Initial conditions for a batch of bodies, one array per field"""
+
+    def __init__(self, pos, velocity, mass, radius, colors, names=None):
+        self.pos = pos
+        self.velocity = velocity
+        self.mass = mass
+        self.radius = radius
+        self.colors = colors
+        self.names = names
+
+    def __len__(self):
+        return len(self.pos)
+
+    def add_to(self, store=None):
+        """Append the bodies to store (default: the store being built), returns their indices"""
+        store = store if store is not None else BodyStore.current()
+        return store.extend(self.names, self.pos, self.mass, self.radius, self.velocity, self.colors)
+
+
+def _colors(rng, n):
+    return _PALETTE[rng.integers(0, len(PALETTE), n)].tolist()
+
+
+def _tangential(angle, speed):
+    return np.column_stack((-np.sin(angle) * speed, np.cos(angle) * speed))
+
+
+def _with_primary(arrays, mass, radius, color, name, center):
+    ## prepend a body at rest at the center (the planet of a belt, the star of a disk)
+    arrays.pos = np.vstack((center, arrays.pos))
+    arrays.velocity = np.vstack(((0.0, 0.0), arrays.velocity))
+    arrays.mass = np.concatenate(([mass], arrays.mass))
+    arrays.radius = np.concatenate(([radius], arrays.radius))
+    arrays.colors = [color] + arrays.colors
+    arrays.names = [name] + [None] * (len(arrays.pos) - 1)
+    return arrays
+
+
+def plummer_sphere(n, G, seed=0, total_mass=10000.0, scale=100.0, cutoff=10.0, radius=2.0, center=CENTER):
+    """Plummer model sampled in 3D (Aarseth et al. 1974) and seen face-on
+
+    The projection drops the z motion while bringing bodies closer together, so in the
+    plane it starts a bit cold (2K/|W| ~ 0.4) and contracts before settling.
+    """
+    rng = np.random.default_rng(seed)
+
+    ## radii from the inverse cumulative mass, truncated at cutoff * scale
+    top = cutoff ** 3 / (cutoff ** 2 + 1) ** 1.5
+    r = scale / np.sqrt(rng.uniform(0, top, n) ** (-2 / 3) - 1)
+    pos = _isotropic(rng, n) * r[:, np.newaxis]
+
+    ## speed as a fraction q of the local escape speed, q drawn from q^2 (1 - q^2)^3.5
+    ## by rejection; the 0.1 envelope accepts about half of the candidates
+    q = np.empty(0)
+    while len(q) < n:
+        x = rng.uniform(0, 1, 2 * (n - len(q)) + 64)
+        y = rng.uniform(0, 0.1, len(x))
+        w = 1 - x * x
+        q = np.concatenate((q, x[y < x * x * w * w * w * np.sqrt(w)]))
+    escape = np.sqrt(2 * G * total_mass) * (r * r + scale * scale) ** -0.25
+    velocity = _isotropic(rng, n) * (q[:n] * escape)[:, np.newaxis]
+
+    return SceneArrays(pos[:, :2] + center, velocity[:, :2], np.full(n, total_mass / n), np.full(n, float(radius)),
+                       _colors(rng, n))
+
+
+def _isotropic(rng, n):
+    ## unit vectors uniform on the sphere
+    z = rng.uniform(-1, 1, n)
+    phi = rng.uniform(0, 2 * math.pi, n)
+    s = np.sqrt(1 - z * z)
+    return np.column_stack((s * np.cos(phi), s * np.sin(phi), z))
+
+
+def keplerian_disk(n, G, seed=0, star_mass=20000.0, disk_mass=2000.0, inner=60.0, outer=330.0,
+                   dispersion=0.02, radius=2.0, center=CENTER):
+    """Star plus a self-gravitating disk with surface density ~ 1/r on circular orbits
+
+    M in sqrt(G * M / r) is the star plus the disk mass inside r (the expected value,
+    which for this density grows linearly from inner to outer).
+    """
+    rng = np.random.default_rng(seed)
+    r = rng.uniform(inner, outer, n)
+    angle = rng.uniform(0, 2 * math.pi, n)
+    mass = np.full(n, disk_mass / n)
+
+    enclosed = disk_mass * (r - inner) / (outer - inner)
+    speed = np.sqrt(G * (star_mass + enclosed) / r) * (1 + dispersion * rng.standard_normal(n))
+
+    pos = np.column_stack((np.cos(angle) * r, np.sin(angle) * r)) + center
+    arrays = SceneArrays(pos, _tangential(angle, speed), mass, np.full(n, float(radius)), _colors(rng, n))
+    return _with_primary(arrays, star_mass, 20.0, "yellow", "Star", center)
+
+
+def belt(n, G, seed=0, primary_mass=8000.0, primary_radius=20.0, inner=100.0, outer=170.0,
+         mass_range=(1.0, 400.0), eccentricity=0.1, center=CENTER):
+    """Belt of light bodies around one primary, like create_asteroid_cluster at any N
+
+    Bodies are spread evenly over the annulus, masses are log-uniform with radius
+    following mass^(1/3), and orbits are perturbed from circular by up to `eccentricity`.
+    """
+    rng = np.random.default_rng(seed)
+    r = np.sqrt(rng.uniform(inner * inner, outer * outer, n))
+    angle = rng.uniform(0, 2 * math.pi, n)
+    mass = np.exp(rng.uniform(math.log(mass_range[0]), math.log(mass_range[1]), n))
+    radius = np.maximum(1.0, np.cbrt(mass))
+
+    speed = np.sqrt(G * primary_mass / r) * (1 + rng.uniform(-eccentricity, eccentricity, n))
+    velocity = _tangential(angle, speed)
+    ## a little radial motion as well, so the belt isn't perfectly cold
+    velocity += np.column_stack((np.cos(angle), np.sin(angle))) * (speed * rng.uniform(-eccentricity, eccentricity, n))[:, np.newaxis]
+
+    pos = np.column_stack((np.cos(angle) * r, np.sin(angle) * r)) + center
+    arrays = SceneArrays(pos, velocity, mass, radius, _colors(rng, n))
+    return _with_primary(arrays, primary_mass, primary_radius, "lightblue", "Primary", center)
+
+
+def generated_scene(generator, *args, **kwargs):
+    """Builder for Simulation.load: adds generator(*args, **kwargs) to the store being built"""
+    def build():
+        return generator(*args, **kwargs).add_to()
+    return build
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    G = 5000
+    for generator in (plummer_sphere, keplerian_disk, belt):
+        store = BodyStore(capacity=n + 1)
+        start = time.perf_counter()
+        generator(n, G, seed=1).add_to(store)
+        elapsed = time.perf_counter() - start
+        again = generator(n, G, seed=1)
+        same = np.array_equal(again.pos, store.pos) and np.array_equal(again.velocity, store.velocity)
+        print(f"{generator.__name__:<15} {len(store):>9,} bodies  {elapsed * 1000:7.1f} ms  reproducible: {same}")
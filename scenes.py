@@ -0,0 +1,378 @@
+import math
+import random
+
+import pygame
+
+from bodyStore import BodyStore, BodyView
+from sceneGenerators import belt, generated_scene, keplerian_disk, plummer_sphere
+
+## Scene definitions shared by the demo viewers and headless runs. Body classes here are
+## handles into whichever BodyStore is being built (see Simulation.load), and nothing in
+## this module opens a window.
+
+G = 5000  # Scaled gravitational constant for the cluster scenes
+NEWTON_G = 1000  # newtonUniversalGravitation.py, scaled for visual effects
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def _rng(seed):
+    ## builders take seed=None for a new scene every time (the global random), or a seed
+    ## for the same scene every time; large scenes belong in sceneGenerators.py
+    return random if seed is None else random.Random(seed)
+
+
+## ---- small body clusters (clusterDemo.py) ----
+
+class CelestialBody(BodyView):   
+    __slots__ = ()
+
+    def __init__(self, name, pos, mass, radius, velocity=None, color="white"):
+        store = BodyStore.current()
+        super().__init__(store, store.add(name, pos, mass, radius, velocity, color))
+
+    def calculate_gravitational_force(self, other_body): 
+        directional_vector = other_body.pos - self.pos
+        dist = math.hypot(directional_vector[0], directional_vector[1])
+
+        # Prevent extreme forces
+        min_dist = max(self.radius + other_body.radius, 5)
+        if dist < min_dist:
+            dist = min_dist
+        
+        force_magnitude = (G * self.mass * other_body.mass) / (dist ** 2)
+
+        if dist > 0: 
+            force_direction = directional_vector / dist
+            force_vector = force_direction * force_magnitude
+            accel_gravity = force_vector / self.mass
+            self.acceleration += accel_gravity
+    
+    def reset_acceleration(self):
+        self.acceleration = 0
+
+    def update_position(self, dt): 
+        self.velocity += self.acceleration * dt 
+        self.pos += self.velocity * dt
+
+    def draw(self, screen): 
+        pos = self.pos
+        radius = self.radius
+        trail = self.trail
+        # Draw trail
+        if len(trail) > 1:
+            for i in range(1, len(trail)):
+                alpha = i / len(trail)
+                trail_radius = max(1, int(radius * alpha * 0.3))
+                
+                # Fade the color
+                color = pygame.Color(self.color)
+                faded_color = (int(color.r * alpha * 0.6), 
+                              int(color.g * alpha * 0.6), 
+                              int(color.b * alpha * 0.6))
+                pygame.draw.circle(screen, faded_color, trail[i], trail_radius)
+        
+        # Draw main body
+        pygame.draw.circle(screen, self.color, pos, radius)
+        
+        # Draw name if radius is large enough
+        if radius > 8:
+            font = pygame.font.Font(None, 16)
+            text = font.render(self.name, True, self.color)
+            text_rect = text.get_rect(center=(pos[0], pos[1] + radius + 12))
+            screen.blit(text, text_rect)
+
+def create_asteroid_cluster(seed=None):
+    """Create a cluster of main belt asteroids"""
+    rng = _rng(seed)
+    center = pygame.Vector2(640, 360)
+    bodies = []
+    
+    # Ceres - largest, at center
+    bodies.append(CelestialBody("Ceres", center, 8000, 20, pygame.Vector2(0, 0), "lightblue"))
+    
+    # Other asteroids in orbit around the cluster center
+    asteroids = [
+        ("Vesta", 3500, 12, "orange"),
+        ("Pallas", 3200, 11, "gray"),
+        ("Hygiea", 2800, 10, "darkgray"),
+        ("Interamnia", 2200, 8, "brown"),
+        ("Davida", 1800, 7, "tan"),
+        ("Sylvia", 1600, 6, "lightgray"),
+        ("Cybele", 1400, 6, "darkblue")
+    ]
+    
+    for i, (name, mass, radius, color) in enumerate(asteroids):
+        angle = (i / len(asteroids)) * 2 * math.pi
+        distance = 120 + rng.randint(-30, 50)
+        
+        pos = center + pygame.Vector2(
+            math.cos(angle) * distance,
+            math.sin(angle) * distance
+        )
+        
+        # Orbital velocity perpendicular to radius
+        orbital_speed = math.sqrt(G * 8000 / distance) * 0.8  # Slightly elliptical
+        velocity = pygame.Vector2(-math.sin(angle), math.cos(angle)) * orbital_speed
+        velocity += pygame.Vector2(rng.randint(-20, 20), rng.randint(-20, 20))  # Add some chaos
+        
+        bodies.append(CelestialBody(name, pos, mass, radius, velocity, color))
+    
+    return bodies
+
+def create_kuiper_belt_cluster(seed=None):
+    """Create a cluster of Kuiper Belt Objects"""
+    rng = _rng(seed)
+    bodies = []
+    center = pygame.Vector2(640, 360)
+    
+    # Pluto-Charon system at center
+    pluto_pos = center + pygame.Vector2(-15, 0)
+    charon_pos = center + pygame.Vector2(15, 0)
+    
+    bodies.append(CelestialBody("Pluto", pluto_pos, 6000, 15, pygame.Vector2(0, -30), "brown"))
+    bodies.append(CelestialBody("Charon", charon_pos, 2000, 8, pygame.Vector2(0, 90), "gray"))
+    
+    # Other KBOs
+    kbos = [
+        ("Eris", 5800, 14, "white"),
+        ("Makemake", 3500, 11, "red"),
+        ("Haumea", 4200, 12, "yellow"),
+        ("Orcus", 2800, 9, "purple"),
+        ("Quaoar", 3200, 10, "lightblue"),
+        ("Sedna", 2600, 8, "orange")
+    ]
+    
+    for i, (name, mass, radius, color) in enumerate(kbos):
+        angle = rng.uniform(0, 2 * math.pi)
+        distance = rng.randint(150, 280)
+        
+        pos = center + pygame.Vector2(
+            math.cos(angle) * distance,
+            math.sin(angle) * distance
+        )
+        
+        # Random orbital velocity
+        speed = rng.randint(40, 80)
+        velocity = pygame.Vector2(
+            rng.uniform(-1, 1),
+            rng.uniform(-1, 1)
+        ).normalize() * speed
+        
+        bodies.append(CelestialBody(name, pos, mass, radius, velocity, color))
+    
+    return bodies
+
+def create_jovian_moon_system(seed=None):
+    """Create Jupiter's major moons system"""
+    rng = _rng(seed)
+    bodies = []
+    jupiter_pos = pygame.Vector2(640, 360)
+    
+    # Jupiter at center
+    bodies.append(CelestialBody("Jupiter", jupiter_pos, 20000, 35, pygame.Vector2(0, 0), "orange"))
+    
+    # Galilean moons
+    moons = [
+        ("Io", 80, 2500, 8, "yellow"),
+        ("Europa", 110, 2200, 7, "lightblue"),
+        ("Ganymede", 150, 4000, 12, "brown"),
+        ("Callisto", 200, 3500, 10, "darkgray")
+    ]
+    
+    for name, distance, mass, radius, color in moons:
+        angle = rng.uniform(0, 2 * math.pi)
+        pos = jupiter_pos + pygame.Vector2(
+            math.cos(angle) * distance,
+            math.sin(angle) * distance
+        )
+        
+        # Circular orbital velocity
+        orbital_speed = math.sqrt(G * 20000 / distance)
+        velocity = pygame.Vector2(-math.sin(angle), math.cos(angle)) * orbital_speed
+        
+        bodies.append(CelestialBody(name, pos, mass, radius, velocity, color))
+    
+    return bodies
+
+def create_random_small_bodies(seed=None):
+    """Create a random cluster of small bodies"""
+    rng = _rng(seed)
+    bodies = []
+    
+    for i in range(12):
+        pos = pygame.Vector2(
+            rng.randint(100, 1180),
+            rng.randint(100, 620)
+        )
+        
+        mass = rng.randint(800, 3000)
+        radius = max(4, mass // 200)
+        
+        velocity = pygame.Vector2(
+            rng.randint(-60, 60),
+            rng.randint(-60, 60)
+        )
+        
+        colors = ["white", "gray", "brown", "orange", "yellow", "lightblue", "red", "purple"]
+        color = rng.choice(colors)
+        
+        bodies.append(CelestialBody(f"Body{i+1}", pos, mass, radius, velocity, color))
+    
+    return bodies
+
+## integrator each cluster scene starts with, see integrators.INTEGRATORS (default "euler").
+## "block" (I key) gives close pairs their own small steps, but with a dozen bodies its
+## extra small force passes cost more than leapfrog's global step, so it's nobody's default
+scene_integrators = {
+    "Kuiper Belt Objects": "leapfrog",
+    "Jovian Moon System": "yoshida4",
+    "Random Small Bodies": "leapfrog",
+    "Plummer Sphere": "leapfrog",
+    "Keplerian Disk": "leapfrog",
+    "Asteroid Belt (seeded)": "leapfrog",
+}
+
+simulations = [
+    ("Asteroid Belt Cluster", create_asteroid_cluster),
+    ("Kuiper Belt Objects", create_kuiper_belt_cluster),
+    ("Jovian Moon System", create_jovian_moon_system),
+    ("Random Small Bodies", create_random_small_bodies),
+    ## array-built scenes, the same bodies on every reset
+    ("Plummer Sphere", generated_scene(plummer_sphere, 300, G, seed=1)),
+    ("Keplerian Disk", generated_scene(keplerian_disk, 300, G, seed=2)),
+    ("Asteroid Belt (seeded)", generated_scene(belt, 300, G, seed=3)),
+]
+
+
+## ---- three body orbits (newtonUniversalGravitation.py) ----
+
+class GravityBody(BodyView): 
+    __slots__ = ("bounce_damping",)
+
+    def __init__(self, pos, mass=None, radius = 40, velocity=None, acceleration=None):
+        mass = mass if mass is not None else radius
+        store = BodyStore.current()
+        super().__init__(store, store.add(None, pos, mass, radius, velocity))
+        self.bounce_damping = 0.8
+
+    def calculate_gravitational_force(self, other_body): 
+        ## logic to calculate gravitational force between 2 objects
+
+        directional_vector = other_body.pos - self.pos
+        dist = (directional_vector[0] ** 2 + directional_vector[1] ** 2) ** 0.5
+
+        if dist < self.radius + other_body.radius: ## to avoid collision, could also just make them explode at contact
+            dist = self.radius + other_body.radius
+        
+        ## Newton's Law of Universal Gravitation F_g = (G * m1m2) / distance^2 
+        force_magnitude = (NEWTON_G * self.mass * other_body.mass) / (dist ** 2)
+
+        if dist > 0: 
+            force_direction = directional_vector / dist
+        else: 
+            force_direction = directional_vector * 0
+        
+        ## force vector 
+        force_vector = force_direction * force_magnitude
+
+        ## F = ma, so a = F / m 
+        accelGravity = force_vector / self.mass
+
+        self.acceleration += accelGravity
+    
+    def reset_acceleration(self):  # Fixed typo in method name
+        ## acceleration set to 0 before calculating any forces 
+        self.acceleration = 0
+
+    def updatePos(self, dt, screen_width, screen_height): 
+        self.velocity += self.acceleration * dt 
+        self.pos += self.velocity * dt
+
+    def drawCircle(self, screen): 
+
+        # Draw trail -- don't rlly worry abt how this works, this is just to show the path they are affected and not really relevant to concept at hand
+        trail = self.trail
+        if len(trail) > 1:
+            for i in range(1, len(trail)):
+                alpha = i / len(trail)
+                trail_radius = max(1, int(self.radius * alpha * 0.3))
+                trail_color = (int(255 * alpha), int(255 * alpha), int(255 * alpha))
+                pygame.draw.circle(screen, trail_color, trail[i], trail_radius)
+        
+        ## body
+        pygame.draw.circle(screen, "white", self.pos, self.radius)
+
+        # Draw a smaller circle to show the center
+        pygame.draw.circle(screen, "red", self.pos, 3)
+
+def create_three_body_system():
+    """The three bodies newtonUniversalGravitation.py starts (and resets) with"""
+    return [
+        GravityBody((300, 300), mass=5000, radius=30, velocity=pygame.Vector2(0, -50)),
+        GravityBody((900, 300), mass=8000, radius=40, velocity=pygame.Vector2(0, 50)),
+        GravityBody((600, 150), mass=2000, radius=20, velocity=pygame.Vector2(30, 0))
+    ]
+
+
+## ---- bouncing balls (earthGravity.py) ----
+
+## no initial velocity, but constant dowward acceleratio going at 500 pixels per second, default mimicks earth's gravity
+class BouncingBody(BodyView): 
+    __slots__ = ("bounce_damping",)
+
+    def __init__(self, pos, mass=None, radius = 40, velocity=None, acceleration=None):
+        mass = mass if mass is not None else radius
+        store = BodyStore.current()
+        super().__init__(store, store.add(None, pos, mass, radius, velocity))
+        self.acceleration = acceleration if acceleration is not None else (0, 500)
+        self.bounce_damping = 0.8
+    
+    def updatePos(self, dt, screen_width, screen_height): 
+        self.velocity += self.acceleration * dt 
+        self.pos += self.velocity * dt
+        self.bounce_off_walls(screen_width, screen_height)
+
+    def bounce_off_walls(self, screen_width, screen_height):
+        pos = self.pos
+        velocity = self.velocity
+        radius = self.radius
+
+        # Bounce off bottom
+        if pos[1] + radius >= screen_height:
+            pos[1] = screen_height - radius
+            velocity[1] = -velocity[1] * self.bounce_damping
+
+        # Bounce off top
+        if pos[1] - radius <= 0:
+            pos[1] = radius
+            velocity[1] = -velocity[1] * self.bounce_damping
+
+        # Bounce off right
+        if pos[0] + radius >= screen_width:
+            pos[0] = screen_width - radius
+            velocity[0] = -velocity[0] * self.bounce_damping
+
+        # Bounce off left
+        if pos[0] - radius <= 0:
+            pos[0] = radius
+            velocity[0] = -velocity[0] * self.bounce_damping
+
+    def drawCircle(self, screen): 
+        pygame.draw.circle(screen, "white", self.pos, self.radius)
+
+def create_bouncing_balls():
+    """Default four ball scene of earthGravity.py"""
+    return [BouncingBody((300, 100)), BouncingBody((600, 50)), BouncingBody((900, 150), radius=30),
+            BouncingBody((600, 80), velocity=(400, 0))]
+
+def create_ball_pit(count=2000, seed=None):
+    """Lots of small balls dropped over the whole screen"""
+    rng = _rng(seed)
+    bodies = []
+    for i in range(count):
+        radius = rng.randint(3, 7)
+        pos = (rng.uniform(radius, WIDTH - radius), rng.uniform(radius, HEIGHT / 2))
+        velocity = (rng.uniform(-100, 100), rng.uniform(-50, 50))
+        bodies.append(BouncingBody(pos, radius=radius, velocity=velocity))
+    return bodies
@@ -0,0 +1,148 @@
+import time
+
+from bodyStore import BodyStore
+from frameProfiler import FrameProfiler
+from integrators import SemiImplicitEuler, make_integrator
+
+## Fixed-timestep simulation loop that knows nothing about windows or pygame.display.
+## The demo scripts used to integrate with whatever dt clock.tick(60) handed back, so
+## physics ran at display speed and two runs never matched. A Simulation always steps
+## by the same dt (optionally split into substeps), can be run flat out for batch jobs,
+## and viewers just feed it wall-clock time through advance() and draw the store.
+## The integrator is pluggable (see integrators.py) and defaults to semi-implicit Euler.
+## Steps are marked as "integrate", "force", "constraints" and "trails" phases for a
+## FrameProfiler, which costs next to nothing while the profiler is disabled.
+## Optional Diagnostics (diagnostics.py) sample energy and momenta as the run goes.
+
+
+class Simulation:
+    """A scene's bodies plus the force pass and integrator that move them"""
+
+    def __init__(self, store=None, forces=None, dt=1 / 60, substeps=1, trails=None, constraints=(), integrator=None,
+                 profiler=None, diagnostics=None):
+        self.store = store if store is not None else BodyStore()
+        self.forces = forces  # e.g. an AccelerationEngine, None keeps each body's own acceleration
+        self.integrator = integrator
+        self.dt = dt
+        self.substeps = max(1, int(substeps))
+        self.trails = trails
+        self.store.trails = trails
+        ## callables (store, h) run after every substep, e.g. wall bounces and collisions;
+        ## one that returns False promises it left the bodies alone this time
+        self.constraints = list(constraints)
+        self.max_catch_up = 8  # most steps advance() will take for one frame
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.diagnostics = diagnostics
+        self.reset_clock()
+
+    @property
+    def integrator(self):
+        return self._integrator
+
+    @integrator.setter
+    def integrator(self, integrator):
+        ## an integrator object or a name from integrators.INTEGRATORS, default semi-implicit Euler
+        if integrator is None:
+            integrator = SemiImplicitEuler()
+        elif isinstance(integrator, str):
+            integrator = make_integrator(integrator)
+        self._integrator = integrator
+
+    def reset_clock(self):
+        self.time = 0.0
+        self.steps = 0
+        self.force_evaluations = 0  # force passes
+        self.body_evaluations = 0  # bodies whose acceleration was computed, summed over passes
+        self._accumulator = 0.0
+
+    def _accelerate(self, store, targets=None):
+        evaluated = len(store) if targets is None else len(targets)
+        self.force_evaluations += 1
+        self.body_evaluations += evaluated
+        if self.forces is not None:
+            self.profiler.count("interactions", evaluated * len(store))
+            with self.profiler.phase("force"):
+                if targets is None:
+                    self.forces.compute_accelerations(store)
+                else:
+                    self.forces.compute_accelerations(store, targets)
+        return store.acceleration
+
+    def load(self, builder):
+        """Replace the current bodies with whatever builder() creates, returns its result"""
+        self.store.clear()
+        if self.trails is not None:
+            self.trails.clear()
+        self.reset_clock()
+        self.integrator.reset()
+        with self.store.building():
+            built = builder()
+        if self.diagnostics is not None:
+            ## first sample is the initial state, drift is measured against it
+            self.diagnostics.reset()
+            self.diagnostics.update(self)
+        return built
+
+    def step(self):
+        h = self.dt / self.substeps
+        store = self.store
+        profiler = self.profiler
+        for _ in range(self.substeps):
+            with profiler.phase("integrate"):
+                self.integrator.step(store, self._accelerate, h)
+            if self.constraints:
+                changed = False
+                with profiler.phase("constraints"):
+                    for constraint in self.constraints:
+                        changed |= constraint(store, h) is not False
+                if changed:
+                    ## constraints may have moved bodies, so no reusing accelerations across steps
+                    self.integrator.reset()
+        if self.trails is not None:
+            with profiler.phase("trails"):
+                self.trails.record(store.pos)
+        self.steps += 1
+        self.time += self.dt
+        if self.diagnostics is not None:
+            with profiler.phase("diagnostics"):
+                self.diagnostics.update(self)
+
+    def run(self, steps):
+        """Take `steps` fixed steps as fast as possible, returns steps per second"""
+        start = time.perf_counter()
+        for _ in range(steps):
+            self.step()
+        elapsed = time.perf_counter() - start
+        return steps / elapsed if elapsed > 0 else float("inf")
+
+    def run_for(self, seconds):
+        """Advance simulated time by `seconds`, rounded to whole steps"""
+        return self.run(int(round(seconds / self.dt)))
+
+    def advance(self, real_dt):
+        """Catch up with `real_dt` seconds of wall-clock time, returns the number of steps taken"""
+        self._accumulator += real_dt
+        taken = 0
+        while self._accumulator >= self.dt and taken < self.max_catch_up:
+            self.step()
+            self._accumulator -= self.dt
+            taken += 1
+        if taken == self.max_catch_up:
+            ## too slow to keep up: drop the backlog instead of spiralling
+            self._accumulator = 0.0
+        return taken
+
+
+if __name__ == "__main__":
+    import sys
+
+    from gravityKernels import AccelerationEngine
+    from scenes import G, scene_integrators, simulations
+
+    ## headless batch run of every cluster scene
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for title, builder in simulations:
+        sim = Simulation(forces=AccelerationEngine(G, min_dist=5), integrator=scene_integrators.get(title))
+        sim.load(builder)
+        rate = sim.run(steps)
+        print(f"{title:<24} {len(sim.store):>5} bodies  {sim.integrator.name:<9} {steps} steps  {rate:,.0f} steps/s")
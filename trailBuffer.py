@@ -0,0 +1,123 @@
+import itertools
+
+import numpy as np
+
+## Motion trails for every body in one circular buffer. Appending a Vector2 copy and
+## calling trail.pop(0) per body per frame is O(trail length) and allocates each time;
+## here a frame is one array copy into the next slot and old samples are simply
+## overwritten. The ordered history is handed out as (at most two) views, no copies.
+##
+## Copies that follow a buffer (the snapshots of physicsThread.py) use sync_from(), which
+## only copies the slots recorded since the last sync. Anything that rewrites every slot
+## (clear, compact, growing) gives the buffer a new `version`, and the next sync from it
+## is a full copy.
+
+_versions = itertools.count()
+
+
+class TrailBuffer:
+    """Fixed-length circular position history shared by all bodies of a scene"""
+
+    def __init__(self, length=80, capacity=64, every=1):
+        self.length = int(length)
+        self.every = max(1, int(every))  # record one sample every `every` steps
+        self._points = np.zeros((self.length, max(1, int(capacity)), 2))
+        self._valid = np.zeros(self._points.shape[1], dtype=np.int64)
+        self.clear()
+
+    @property
+    def capacity(self):
+        return self._points.shape[1]
+
+    def clear(self):
+        self.head = 0  # slot the next sample goes into
+        self.filled = 0  # how many slots hold a sample
+        self.recorded = 0  # samples recorded since the last version change
+        self.version = next(_versions)
+        self._step = 0
+        self._valid[:] = 0
+
+    def _grow(self, count):
+        capacity = self.capacity
+        while capacity < count:
+            capacity *= 2
+        points = np.zeros((self.length, capacity, 2))
+        points[:, :self.capacity] = self._points
+        valid = np.zeros(capacity, dtype=np.int64)
+        valid[:self.capacity] = self._valid
+        self._points, self._valid = points, valid
+        self.version, self.recorded = next(_versions), 0
+
+    def compact(self, keep):
+        """Follow BodyStore.compact: drop the trails of removed bodies, keep the rest in order"""
+        keep = np.asarray(keep, dtype=bool)[:self.capacity]  # later bodies have no samples yet
+        kept = np.flatnonzero(keep)
+        self._points[:, :len(kept)] = self._points[:, kept]
+        self._valid[:len(kept)] = self._valid[kept]
+        self._valid[len(kept):] = 0
+        self.version, self.recorded = next(_versions), 0
+
+    def copy_from(self, other):
+        """Become a copy of another TrailBuffer of the same length, reusing this one's arrays"""
+        if other.capacity > self.capacity:
+            self._grow(other.capacity)
+        k = other.capacity
+        self._points[:, :k] = other._points
+        self._valid[:k] = other._valid
+        self._valid[k:] = 0
+        self.head, self.filled, self._step = other.head, other.filled, other._step
+        self.version, self.recorded = other.version, other.recorded
+
+    def sync_from(self, other):
+        """copy_from, but only the slots `other` recorded since this buffer last synced from it"""
+        new = other.recorded - self.recorded
+        if (self.version != other.version or other.capacity > self.capacity or new < 0
+                or new >= self.length):
+            return self.copy_from(other)
+        k = other.capacity
+        for back in range(new, 0, -1):
+            slot = (other.head - back) % self.length
+            self._points[slot, :k] = other._points[slot]
+        self._valid[:k] = other._valid
+        self.head, self.filled, self._step = other.head, other.filled, other._step
+        self.recorded = other.recorded
+
+    def record(self, pos):
+        """Store the current positions (n, 2), returns True if this step was sampled"""
+        step = self._step
+        self._step += 1
+        if step % self.every:
+            return False
+
+        n = len(pos)
+        if n > self.capacity:
+            self._grow(n)
+        self._points[self.head, :n] = pos
+        ## bodies that weren't there last sample (or were removed) start a fresh trail
+        self._valid[n:] = 0
+        valid = self._valid[:n]
+        valid += 1
+        np.minimum(valid, self.length, out=valid)
+        self.head = (self.head + 1) % self.length
+        self.filled = min(self.filled + 1, self.length)
+        self.recorded += 1
+        return True
+
+    def segments(self):
+        """Chronological (older, newer) views of every body's samples, each shaped (k, capacity, 2)"""
+        if self.filled < self.length:
+            return self._points[:self.head], self._points[:0]
+        return self._points[self.head:], self._points[:self.head]
+
+    def history(self, index):
+        """Ordered samples (oldest first) of one body"""
+        if index >= self.capacity:
+            return self._points[:0, 0]  # added since the last sample, no trail yet
+        count = int(self._valid[index])
+        older, newer = self.segments()
+        if count <= len(newer):
+            return newer[len(newer) - count:, index]
+        if not len(newer):
+            return older[len(older) - count:, index]
+        ## the only case that wraps round the end of the buffer, one small copy
+        return np.concatenate((older[len(older) - (count - len(newer)):, index], newer[:, index]))
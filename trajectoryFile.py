@@ -0,0 +1,219 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+## On-disk snapshots and trajectories. A file is a small header, a JSON block with the
+## per-body metadata that never changes (ids, names, colors of the bodies when the file
+## was opened) plus whatever the caller adds, and then fixed-size frame records one
+## after another:
+##
+##   time f8 | step i8 | count i8 | pos (capacity, 2) f8 | velocity (capacity, 2) f8
+##   | mass (capacity,) f8 | radius (capacity,) f8 | body (capacity,) i8
+##
+## Every frame has room for `capacity` bodies and says how many are live, so scenes
+## that lose bodies (merging) still fit. `body` holds each row's BodyStore id, so after
+## a merge has compacted the store the rows still find their own names and colors.
+## Bodies added after the file was opened have no metadata and come back unnamed.
+## Frames are buffered and written a chunk at a time, and readers np.memmap the frame
+## array so any frame of a multi-GB run can be read without loading the rest.
+
+MAGIC = b"NBODYTRJ"
+VERSION = 2  # 1 had no body column, rows were matched to the metadata by position
+_HEADER = struct.Struct("<8sIIQd")  # magic, version, metadata length, capacity, dt
+
+
+def frame_dtype(capacity, version=VERSION):
+    fields = [
+        ("time", "<f8"),
+        ("step", "<i8"),
+        ("count", "<i8"),
+        ("pos", "<f8", (capacity, 2)),
+        ("velocity", "<f8", (capacity, 2)),
+        ("mass", "<f8", (capacity,)),
+        ("radius", "<f8", (capacity,)),
+    ]
+    if version >= 2:
+        fields.append(("body", "<i8", (capacity,)))
+    return np.dtype(fields)
+
+
+class TrajectoryWriter:
+    """Appends frames of a BodyStore to a trajectory file, a chunk at a time"""
+
+    def __init__(self, path, store, dt=0.0, chunk_frames=64, capacity=None, metadata=None):
+        self.path = path
+        self.capacity = int(capacity if capacity is not None else max(len(store), 1))
+        self.dtype = frame_dtype(self.capacity)
+        self._chunk = np.zeros(chunk_frames, dtype=self.dtype)
+        self._buffered = 0
+        self.frames = 0
+
+        meta = dict(metadata or {})
+        meta["ids"] = store.ids.tolist()
+        meta["names"] = list(store.names[:len(store)])
+        ## colors are names or RGB tuples, both survive JSON (tuples as lists)
+        meta["colors"] = [c if isinstance(c, str) else list(c) for c in store.colors[:len(store)]]
+        blob = json.dumps(meta).encode()
+        ## pad so the frame array starts 8-byte aligned
+        blob += b" " * (-(_HEADER.size + len(blob)) % 8)
+
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, len(blob), self.capacity, dt))
+        self._file.write(blob)
+
+    def append(self, store, time=0.0, step=0):
+        n = len(store)
+        if n > self.capacity:
+            raise ValueError(f"{n} bodies don't fit a trajectory with capacity {self.capacity}")
+        frame = self._chunk[self._buffered]
+        frame["time"] = time
+        frame["step"] = step
+        frame["count"] = n
+        frame["pos"][:n] = store.pos
+        frame["velocity"][:n] = store.velocity
+        frame["mass"][:n] = store.mass
+        frame["radius"][:n] = store.radius
+        frame["body"][:n] = store.ids
+        ## stale rows from a bigger earlier frame are zeroed so files stay deterministic
+        frame["pos"][n:] = frame["velocity"][n:] = 0
+        frame["mass"][n:] = frame["radius"][n:] = 0
+        frame["body"][n:] = -1
+        self._buffered += 1
+        self.frames += 1
+        if self._buffered == len(self._chunk):
+            self.flush()
+
+    def append_simulation(self, sim):
+        self.append(sim.store, sim.time, sim.steps)
+
+    def flush(self):
+        if self._buffered:
+            self._file.write(self._chunk[:self._buffered].tobytes())
+            self._buffered = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    """Memory-mapped view of a trajectory file, frames are read lazily"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, meta_len, capacity, dt = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a trajectory file")
+            if not 1 <= version <= VERSION:
+                raise ValueError(f"{path} has trajectory format version {version}, expected at most {VERSION}")
+            self.metadata = json.loads(f.read(meta_len))
+        self.version = version
+        self.capacity = capacity
+        self.dt = dt
+        self.dtype = frame_dtype(capacity, version)
+        ## metadata row of every body id, version 1 files list the bodies in row order
+        ids = self.metadata.get("ids", range(len(self.metadata.get("names", []))))
+        self._meta_row = {int(body): row for row, body in enumerate(ids)}
+
+        offset = _HEADER.size + meta_len
+        ## frame count comes from the file size, so a run that died mid-way is still readable
+        self.frames = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        if self.frames:
+            self.data = np.memmap(path, dtype=self.dtype, mode="r", offset=offset, shape=(self.frames,))
+        else:
+            self.data = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return self.frames
+
+    def frame(self, index):
+        """(time, step, pos, velocity, mass, radius) of one frame, arrays are views into the file"""
+        record = self.data[index]
+        n = int(record["count"])
+        return (float(record["time"]), int(record["step"]), record["pos"][:n], record["velocity"][:n],
+                record["mass"][:n], record["radius"][:n])
+
+    def positions(self, body, frames=slice(None)):
+        """Track of one body (by row) across frames, shape (frames, 2)"""
+        return self.data["pos"][frames, body]
+
+    def bodies(self, index):
+        """Store ids of the bodies of one frame, in row order"""
+        n = int(self.data[index]["count"])
+        if self.version < 2:
+            return np.arange(n)
+        return self.data[index]["body"][:n]
+
+    def restore(self, store, index=-1):
+        """Refill store with the bodies of one frame, returns (time, step)"""
+        time, step, pos, velocity, mass, radius = self.frame(index)
+        all_names = self.metadata.get("names", [])
+        all_colors = self.metadata.get("colors", [])
+        names, colors = [], []
+        for body in self.bodies(index).tolist():
+            row = self._meta_row.get(body)
+            names.append(None if row is None else all_names[row])
+            color = "white" if row is None else all_colors[row]
+            colors.append(color if isinstance(color, str) else tuple(color))
+        store.clear()
+        store.extend(names, pos, mass, radius, velocity, colors)
+        return time, step
+
+    def restore_simulation(self, sim, index=-1):
+        """Put a Simulation back at a saved frame so the run can carry on from there"""
+        if sim.trails is not None:
+            sim.trails.clear()
+        sim.reset_clock()
+        sim.integrator.reset()
+        sim.time, sim.steps = self.restore(sim.store, index)
+        if sim.diagnostics is not None:
+            sim.diagnostics.reset()
+
+    def close(self):
+        ## memmaps close when the last view goes away
+        self.data = None
+
+
+def save_snapshot(path, sim, metadata=None):
+    """Single frame trajectory holding the current state of a Simulation"""
+    with TrajectoryWriter(path, sim.store, dt=sim.dt, chunk_frames=1, metadata=metadata) as writer:
+        writer.append_simulation(sim)
+
+
+if __name__ == "__main__":
+    import sys
+    import time as clock
+
+    from gravityKernels import AccelerationEngine
+    from scenes import G, scene_integrators, simulations
+    from simulationEngine import Simulation
+
+    ## headless recording of one cluster scene: trajectoryFile.py out.nbt [scene index] [steps]
+    path = sys.argv[1] if len(sys.argv) > 1 else "trajectory.nbt"
+    title, builder = simulations[int(sys.argv[2]) if len(sys.argv) > 2 else 0]
+    steps = int(sys.argv[3]) if len(sys.argv) > 3 else 3600
+
+    sim = Simulation(forces=AccelerationEngine(G, min_dist=5), integrator=scene_integrators.get(title))
+    sim.load(builder)
+    start = clock.perf_counter()
+    with TrajectoryWriter(path, sim.store, dt=sim.dt, metadata={"scene": title}) as writer:
+        writer.append_simulation(sim)
+        for _ in range(steps):
+            sim.step()
+            writer.append_simulation(sim)
+    elapsed = clock.perf_counter() - start
+
+    reader = TrajectoryReader(path)
+    size = os.path.getsize(path)
+    print(f"{title}: {len(reader)} frames of {reader.capacity} bodies, {size / 2 ** 20:.1f} MiB in {elapsed:.2f} s")
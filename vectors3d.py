@@ -0,0 +1,48 @@
+import numpy as np
+
+## 3D vector math over (N, 3) arrays. vector3d in einestienTheoryRelativity.py makes a
+## new object for every +, - and *, which is fine for a couple of vectors and hopeless
+## for a mesh; here every function takes whole arrays of vectors (any leading shape,
+## last axis xyz) and plain +, -, * on the arrays do the rest.
+
+
+def vectors(x, y, z):
+    """Stack coordinate arrays into one (..., 3) array"""
+    return np.stack(np.broadcast_arrays(x, y, z), axis=-1).astype(np.float64)
+
+
+def dot(a, b):
+    return np.einsum("...k,...k->...", a, b)
+
+
+def cross(a, b):
+    return np.cross(a, b)
+
+
+def length(a):
+    return np.sqrt(dot(a, a))
+
+
+def normalize(a):
+    """Unit vectors, zero vectors stay zero"""
+    n = length(a)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        unit = a / n[..., np.newaxis]
+    unit[n == 0] = 0.0
+    return unit
+
+
+def rotate_x(points, angle):
+    """Rotate about the x axis by angle (radians), e.g. to tilt a surface towards the viewer"""
+    c, s = np.cos(angle), np.sin(angle)
+    out = np.empty_like(points, dtype=np.float64)
+    out[..., 0] = points[..., 0]
+    out[..., 1] = points[..., 1] * c - points[..., 2] * s
+    out[..., 2] = points[..., 1] * s + points[..., 2] * c
+    return out
+
+
+def perspective(points, focal, center):
+    """Project camera-space points (z away from the viewer) onto the screen, returns (..., 2)"""
+    scale = focal / np.maximum(focal + points[..., 2], 1e-6)
+    return points[..., :2] * scale[..., np.newaxis] + center